@@ -0,0 +1,226 @@
+"""
+Per-request overhead of `ZipkinMiddleware` on a Starlette app, as JSON.
+
+Drives the app through raw ASGI calls (no server, no network), finished
+spans are counted and dropped by an in-memory transport. For each scenario
+reports mean / p50 / p99 latency, the overhead over the bare app and the
+memory allocated per request (peak above the baseline while the request
+runs, and what is still held once it finished - including the id pools
+refilled during the run).
+
+    python -m benchmarks.asgi [--requests 5000] [--output results.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+import aiozipkin as az
+from aiozipkin.record import Record
+from aiozipkin.transport import TransportABC
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+import starlette_zipkin
+from starlette_zipkin import (
+    B3Headers,
+    UberHeaders,
+    ZipkinConfig,
+    ZipkinMiddleware,
+    trace,
+)
+from starlette_zipkin.tracer import Tracer
+
+CHILDREN = 3
+
+HEADERS = [
+    (b"host", b"localhost:8000"),
+    (b"user-agent", b"benchmark"),
+    (b"accept", b"*/*"),
+    (b"cookie", b"session=" + b"x" * 256),
+]
+
+
+class CountingTransport(TransportABC):
+    def __init__(self) -> None:
+        self.spans = 0
+
+    def send(self, record: Record) -> None:
+        self.spans += 1
+
+    async def close(self) -> None:
+        pass
+
+
+async def message(request):
+    return PlainTextResponse("ok")
+
+
+async def children(request):
+    for i in range(CHILDREN):
+        with trace(f"child {i}"):
+            pass
+    return PlainTextResponse("ok")
+
+
+app = Starlette(routes=[Route("/message", message), Route("/children", children)])
+
+
+def make_scope(path: str) -> Dict[str, Any]:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "scheme": "http",
+        "method": "GET",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"foo=bar",
+        "headers": HEADERS,
+        "server": ("localhost", 8000),
+        "client": ("127.0.0.1", 12345),
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+def make_middleware(
+    header_formatter: Any = B3Headers,
+    sample_rate: float = 1.0,
+    inject_response_headers: bool = True,
+) -> ZipkinMiddleware:
+    tracer = Tracer(
+        CountingTransport(),
+        az.Sampler(sample_rate=sample_rate),
+        az.create_endpoint("benchmark"),
+    )
+    config = ZipkinConfig(
+        header_formatter=header_formatter,
+        inject_response_headers=inject_response_headers,
+    )
+    return ZipkinMiddleware(app, config=config, _tracer=tracer)
+
+
+SCENARIOS = {
+    "bare app": (lambda: app, "/message"),
+    "b3 sampled": (lambda: make_middleware(), "/message"),
+    "b3 unsampled": (lambda: make_middleware(sample_rate=0.0), "/message"),
+    "uber sampled": (lambda: make_middleware(UberHeaders), "/message"),
+    "uber unsampled": (
+        lambda: make_middleware(UberHeaders, sample_rate=0.0),
+        "/message",
+    ),
+    "b3 sampled, trace children": (lambda: make_middleware(), "/children"),
+    "b3 unsampled, trace children": (
+        lambda: make_middleware(sample_rate=0.0),
+        "/children",
+    ),
+    "b3 sampled, no response headers": (
+        lambda: make_middleware(inject_response_headers=False),
+        "/message",
+    ),
+    "b3 unsampled, no response headers": (
+        lambda: make_middleware(sample_rate=0.0, inject_response_headers=False),
+        "/message",
+    ),
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[
+        min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    ]
+
+
+async def measure_latency(asgi_app, path: str, requests: int) -> List[float]:
+    for _ in range(requests // 10):  # warm up
+        await asgi_app(make_scope(path), receive, send)
+    latencies = []
+    perf_counter = time.perf_counter
+    for _ in range(requests):
+        scope = make_scope(path)
+        start = perf_counter()
+        await asgi_app(scope, receive, send)
+        latencies.append(perf_counter() - start)
+    return latencies
+
+
+async def measure_memory(asgi_app, path: str, requests: int) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    peaks = []
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(requests):
+        scope = make_scope(path)
+        baseline = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, "reset_peak"):  # python 3.9+
+            tracemalloc.reset_peak()
+        await asgi_app(scope, receive, send)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {
+        "peak_bytes": statistics.mean(peaks) if peaks else 0.0,
+        "retained_bytes": retained / requests,
+    }
+
+
+async def run(requests: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    bare_mean = None
+    for name, (factory, path) in SCENARIOS.items():
+        asgi_app = factory()
+        latencies = await measure_latency(asgi_app, path, requests)
+        memory = await measure_memory(asgi_app, path, max(requests // 10, 1))
+        latencies.sort()
+        mean = statistics.mean(latencies) * 1e6
+        if bare_mean is None:
+            bare_mean = mean
+        results[name] = {
+            "mean_us": round(mean, 2),
+            "p50_us": round(percentile(latencies, 0.5) * 1e6, 2),
+            "p99_us": round(percentile(latencies, 0.99) * 1e6, 2),
+            "overhead_us": round(mean - bare_mean, 2),
+            "peak_bytes_per_request": round(memory["peak_bytes"]),
+            "retained_bytes_per_request": round(memory["retained_bytes"], 1),
+        }
+    return {
+        "python": platform.python_version(),
+        "starlette_zipkin": starlette_zipkin.__version__,
+        "requests": requests,
+        "scenarios": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--output", help="write the results to a file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.requests))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Memory held per buffered finished span.
+
+Compares what a transport keeps until the batch is flushed:
+- `aiozipkin` record, its `asdict()`, or both (as `tests/conftest.py`
+  `DummyTransport` and `aiozipkin.transport.Transport` do)
+- `SpanRecord` compact tuples (`BoundedTransport`, `WorkerTransport`)
+
+    python -m benchmarks.span_memory
+"""
+import gc
+import json
+import tracemalloc
+
+import aiozipkin as az
+from aiozipkin.record import Record
+
+from starlette_zipkin.record import SpanRecord
+
+SPANS = 10000
+
+
+def make_record(i: int) -> Record:
+    tracer = az.Tracer(None, az.Sampler(sample_rate=1.0), ENDPOINT)
+    context = tracer._next_context(None)
+    record = Record(context, ENDPOINT)
+    record.start(1_600_000_000_000_000 + i)
+    record.name("HTTP GET /message")
+    record.kind(az.SERVER)
+    for key, value in TAGS.items():
+        # each span carries its own tag values
+        record.set_tag(key, value.replace("message", f"message/{i}"))
+    record.finish(1_600_000_000_001_000 + i)
+    return record
+
+
+ENDPOINT = az.create_endpoint("benchmark")
+TAGS = {
+    "component": "asgi",
+    "ip": "10.0.0.1",
+    "http.method": "GET",
+    "http.url": "http://localhost:8000/message?foo=bar",
+    "http.route": "/message",
+    "http.headers": json.dumps({"host": "localhost:8000", "accept": "*/*"}),
+    "query": "foo=bar",
+    "remote_address": "127.0.0.1",
+    "http.status_code": "200",
+    "http.response.headers": json.dumps({"content-length": "2"}),
+}
+
+
+def measure(buffer_span) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    buffered = [buffer_span(make_record(i)) for i in range(SPANS)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(buffered) == SPANS
+    return (after - before) / SPANS
+
+
+def main() -> None:
+    results = {
+        "aiozipkin Record": measure(lambda r: r),
+        "Record.asdict()": measure(lambda r: r.asdict()),
+        "aiozipkin Record + asdict()": measure(lambda r: (r, r.asdict())),
+        "SpanRecord": measure(SpanRecord.from_record),
+    }
+    for name, size in results.items():
+        print(f"{name:<30}{size:8.0f} bytes/span")
+
+
+if __name__ == "__main__":
+    main()
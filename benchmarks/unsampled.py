@@ -0,0 +1,88 @@
+"""
+Per-request overhead of `ZipkinMiddleware` for sampled and unsampled traffic.
+
+Drives the app through raw ASGI calls (no server, no network), spans are
+collected by an in-memory transport.
+
+    python -m benchmarks.unsampled
+"""
+import asyncio
+import time
+
+import aiozipkin as az
+from aiozipkin.record import Record
+from aiozipkin.transport import TransportABC
+from starlette.responses import PlainTextResponse
+
+from starlette_zipkin import ZipkinConfig, ZipkinMiddleware
+
+REQUESTS = 20000
+
+SCOPE = {
+    "type": "http",
+    "scheme": "http",
+    "method": "GET",
+    "path": "/message",
+    "query_string": b"foo=bar",
+    "headers": [
+        (b"host", b"localhost:8000"),
+        (b"user-agent", b"benchmark"),
+        (b"accept", b"*/*"),
+        (b"cookie", b"session=" + b"x" * 256),
+    ],
+    "server": ("localhost", 8000),
+    "client": ("127.0.0.1", 12345),
+}
+
+
+class MemoryTransport(TransportABC):
+    def __init__(self) -> None:
+        self.records: list = []
+
+    def send(self, record: Record) -> None:
+        self.records.append(record)
+
+    async def close(self) -> None:
+        pass
+
+
+async def app(scope, receive, send):
+    await PlainTextResponse("ok")(scope, receive, send)
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+def make_middleware(sample_rate: float) -> ZipkinMiddleware:
+    tracer = az.Tracer(
+        MemoryTransport(),
+        az.Sampler(sample_rate=sample_rate),
+        az.create_endpoint("benchmark"),
+    )
+    return ZipkinMiddleware(app, config=ZipkinConfig(), _tracer=tracer)
+
+
+async def measure(asgi_app) -> float:
+    for _ in range(REQUESTS // 10):  # warm up
+        await asgi_app(dict(SCOPE), receive, send)
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await asgi_app(dict(SCOPE), receive, send)
+    return (time.perf_counter() - start) / REQUESTS * 1e6
+
+
+async def main() -> None:
+    bare = await measure(app)
+    print(f"{'bare app':<24}{bare:8.2f} us/request")
+    for name, rate in [("unsampled (0.0)", 0.0), ("sampled (1.0)", 1.0)]:
+        took = await measure(make_middleware(rate))
+        print(f"{name:<24}{took:8.2f} us/request  (+{took - bare:.2f} us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -48,6 +48,9 @@ setup(
         "aiozipkin <2",
         "starlette >0.14,<21",
     ],
+    entry_points={
+        "console_scripts": ["starlette-zipkin-relay = starlette_zipkin.relay:main"],
+    },
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Environment :: Web Environment",
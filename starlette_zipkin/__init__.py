@@ -1,6 +1,21 @@
-from starlette_zipkin.header_formatters import B3Headers, UberHeaders
+from starlette_zipkin.header_formatters import (
+    B3Headers,
+    CompositeHeaders,
+    UberHeaders,
+    W3CHeaders,
+)
+from starlette_zipkin.ids import IdGenerator
 from starlette_zipkin.middleware import ZipkinConfig, ZipkinMiddleware, get_ip
+from starlette_zipkin.registry import TracerRegistry, shared_tracers
+from starlette_zipkin.sampler import AdaptiveSampler, RateLimitingSampler
+from starlette_zipkin.tail import TailSampler
 from starlette_zipkin.trace import get_root_span, get_tracer, trace
+from starlette_zipkin.transports import (
+    BoundedTransport,
+    RelayTransport,
+    UdpTransport,
+    WorkerTransport,
+)
 
 __version__ = "0.3.0"
 __all__ = [
@@ -8,6 +23,18 @@ __all__ = [
     "ZipkinMiddleware",
     "B3Headers",
     "UberHeaders",
+    "W3CHeaders",
+    "CompositeHeaders",
+    "BoundedTransport",
+    "WorkerTransport",
+    "RelayTransport",
+    "UdpTransport",
+    "RateLimitingSampler",
+    "AdaptiveSampler",
+    "TailSampler",
+    "IdGenerator",
+    "TracerRegistry",
+    "shared_tracers",
     "get_tracer",
     "get_root_span",
     "get_ip",
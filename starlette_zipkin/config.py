@@ -1,7 +1,13 @@
 import json
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
+import aiozipkin as az
+
+from .encoding import JSON, get_encoding
 from .header_formatters import B3Headers
+from .ids import IdGenerator
+from .rules import DEFAULT_REDACTED_HEADERS, HeaderRules, PathRules
+from .transports import BoundedTransport
 
 
 class ZipkinConfig:
@@ -16,6 +22,25 @@ class ZipkinConfig:
         json_encoder: Callable = json.dumps,
         header_formatter: Any = B3Headers,
         header_formatter_kwargs: dict = {},
+        transport: Any = BoundedTransport,
+        transport_kwargs: dict = {},
+        exclude_paths: list = [],
+        route_sample_rates: dict = {},
+        sampler: Any = None,
+        sampler_kwargs: dict = {},
+        tail_sampler: Any = None,
+        tail_sampler_kwargs: dict = {},
+        id_generator: Any = IdGenerator,
+        id_generator_kwargs: dict = {},
+        stats_callback: Optional[Callable] = None,
+        stats_interval: float = 60,
+        shutdown_timeout: float = 10,
+        shared_tracer: bool = False,
+        encoding: str = JSON,
+        header_allowlist: Optional[list] = None,
+        header_denylist: list = [],
+        redact_headers: list = DEFAULT_REDACTED_HEADERS,
+        max_tag_length: Optional[int] = None,
     ):
         self.host = host
         self.port = port
@@ -25,3 +50,34 @@ class ZipkinConfig:
         self.force_new_trace = force_new_trace
         self.json_encoder = json_encoder
         self.header_formatter = header_formatter(**header_formatter_kwargs)
+        # transports need a running event loop, created in `init_tracer`
+        self.transport = transport
+        self.transport_kwargs = transport_kwargs
+        self.path_rules = PathRules(exclude_paths, route_sample_rates)
+        # `sample_rate` is used unless a custom sampler is given
+        if sampler is None:
+            self.sampler = az.Sampler(sample_rate=sample_rate)
+        else:
+            self.sampler = sampler(**sampler_kwargs)
+        # wraps the transport, created in `init_tracer`
+        self.tail_sampler = tail_sampler
+        self.tail_sampler_kwargs = tail_sampler_kwargs
+        self.id_generator = id_generator(**id_generator_kwargs)
+        # called with `ZipkinMiddleware.stats()` at most every `stats_interval`
+        self.stats_callback = stats_callback
+        self.stats_interval = stats_interval
+        # deadline for flushing the spans on lifespan shutdown
+        self.shutdown_timeout = shutdown_timeout
+        # one tracer per collector url and service name in the process
+        self.shared_tracer = shared_tracer
+        # span payload encoding, passed to the transport unless it is JSON
+        get_encoding(encoding)
+        self.encoding = encoding
+        # headers captured into the `http.headers` and `http.response.headers` tags
+        self.header_rules = HeaderRules(
+            header_allowlist, header_denylist, redact_headers, max_tag_length
+        )
+
+    @property
+    def collector_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/v2/spans"
@@ -0,0 +1,161 @@
+"""
+Serialization of finished spans into collector payloads.
+"""
+import gzip
+import json
+import socket
+import struct
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .record import SpanRecord
+
+Encoder = Callable[[Sequence[SpanRecord]], bytes]
+
+JSON = "json"
+JSON_GZIP = "json+gzip"
+PROTO3 = "proto3"
+
+# gzip level 6 compresses span batches nearly as well as 9, several times faster
+GZIP_LEVEL = 6
+
+
+def encode_json(spans: Sequence[SpanRecord]) -> bytes:
+    return json.dumps([span.asdict() for span in spans]).encode("utf-8")
+
+
+def encode_json_gzip(spans: Sequence[SpanRecord]) -> bytes:
+    return gzip.compress(encode_json(spans), compresslevel=GZIP_LEVEL)
+
+
+def encode_json_datagrams(
+    spans: Sequence[SpanRecord], max_size: int
+) -> Tuple[List[Tuple[bytes, int]], int]:
+    """
+    JSON lists of spans packed into payloads of at most `max_size` bytes,
+    with their span count, and the number of spans too large to fit in any.
+    """
+    payloads = []
+    oversize = 0
+    current: List[bytes] = []
+    size = 1  # "[" and "]", minus the missing separator of the first span
+    for span in spans:
+        encoded = json.dumps(span.asdict(), separators=(",", ":")).encode("utf-8")
+        if len(encoded) + 2 > max_size:
+            oversize += 1
+            continue
+        if current and size + len(encoded) + 1 > max_size:
+            payloads.append((b"[" + b",".join(current) + b"]", len(current)))
+            current = []
+            size = 1
+        current.append(encoded)
+        size += len(encoded) + 1
+    if current:
+        payloads.append((b"[" + b",".join(current) + b"]", len(current)))
+    return payloads, oversize
+
+
+# Zipkin proto3 - https://github.com/openzipkin/zipkin-api/blob/master/zipkin.proto
+# field keys are `field number << 3 | wire type`
+_VARINT_BYTES = [bytes([value]) for value in range(0x80)]
+_FIXED64 = struct.Struct("<Q")
+_KINDS = {"CLIENT": 1, "SERVER": 2, "PRODUCER": 3, "CONSUMER": 4}
+_endpoints: Dict[Tuple[Tuple[str, Any], ...], bytes] = {}
+_MAX_ENDPOINTS = 1024
+
+
+def _varint(value: int) -> bytes:
+    if value < 0x80:
+        return _VARINT_BYTES[value]
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(key: bytes, data: bytes) -> bytes:
+    # length delimited field
+    return key + _varint(len(data)) + data
+
+
+def _encode_endpoint(endpoint: Dict[str, Any]) -> bytes:
+    key = tuple(endpoint.items())
+    encoded = _endpoints.get(key)
+    if encoded is not None:
+        return encoded
+    parts = []
+    if endpoint.get("serviceName"):
+        parts.append(_field(b"\x0a", endpoint["serviceName"].encode("utf-8")))
+    if endpoint.get("ipv4"):
+        parts.append(_field(b"\x12", socket.inet_aton(endpoint["ipv4"])))
+    if endpoint.get("ipv6"):
+        parts.append(
+            _field(b"\x1a", socket.inet_pton(socket.AF_INET6, endpoint["ipv6"]))
+        )
+    if endpoint.get("port"):
+        parts.append(b"\x20" + _varint(endpoint["port"]))
+    encoded = b"".join(parts)
+    if len(_endpoints) < _MAX_ENDPOINTS:
+        _endpoints[key] = encoded
+    return encoded
+
+
+def _encode_span(span: SpanRecord) -> bytes:
+    parts = [
+        _field(b"\x0a", bytes.fromhex(span.trace_id)),
+    ]
+    if span.parent_id:
+        parts.append(_field(b"\x12", bytes.fromhex(span.parent_id)))
+    parts.append(_field(b"\x1a", bytes.fromhex(span.span_id)))
+    kind: Optional[int] = _KINDS.get(span.kind)  # type: ignore
+    if kind:
+        parts.append(b"\x20" + _VARINT_BYTES[kind])
+    if span.name:
+        parts.append(_field(b"\x2a", span.name.encode("utf-8")))
+    if span.timestamp:
+        parts.append(b"\x31" + _FIXED64.pack(span.timestamp))
+    if span.duration:
+        parts.append(b"\x38" + _varint(span.duration))
+    if span.local_endpoint:
+        parts.append(_field(b"\x42", _encode_endpoint(span.local_endpoint)))
+    if span.remote_endpoint:
+        parts.append(_field(b"\x4a", _encode_endpoint(span.remote_endpoint)))
+    for value, timestamp in span.annotations:
+        annotation = b"\x09" + _FIXED64.pack(timestamp)
+        annotation += _field(b"\x12", value.encode("utf-8"))
+        parts.append(_field(b"\x52", annotation))
+    for key, tag in zip(span.tag_keys, span.tag_values):
+        entry = _field(b"\x0a", key.encode("utf-8"))
+        entry += _field(b"\x12", str(tag).encode("utf-8"))
+        parts.append(_field(b"\x5a", entry))
+    if span.debug:
+        parts.append(b"\x60\x01")
+    if span.shared:
+        parts.append(b"\x68\x01")
+    return b"".join(parts)
+
+
+def encode_proto3(spans: Sequence[SpanRecord]) -> bytes:
+    """
+    Zipkin `ListOfSpans` protobuf message.
+    """
+    return b"".join([_field(b"\x0a", _encode_span(span)) for span in spans])
+
+
+# encoding -> (encoder, request headers)
+ENCODINGS: Dict[str, Tuple[Encoder, Dict[str, str]]] = {
+    JSON: (encode_json, {"Content-Type": "application/json"}),
+    JSON_GZIP: (
+        encode_json_gzip,
+        {"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    ),
+    PROTO3: (encode_proto3, {"Content-Type": "application/x-protobuf"}),
+}
+
+
+def get_encoding(encoding: str) -> Tuple[Encoder, Dict[str, str]]:
+    try:
+        return ENCODINGS[encoding]
+    except KeyError:
+        raise ValueError(f"Unknown encoding {encoding!r}") from None
@@ -1,4 +1,6 @@
 from .b3 import B3Headers
+from .composite import CompositeHeaders
 from .uber import UberHeaders
+from .w3c import W3CHeaders
 
-__all__ = ["B3Headers", "UberHeaders"]
+__all__ = ["B3Headers", "CompositeHeaders", "UberHeaders", "W3CHeaders"]
@@ -1,15 +1,61 @@
-from typing import Union
+from typing import Any, Mapping, Optional, Union
 
 from aiozipkin import make_context
 from aiozipkin.helpers import (
     FLAGS_HEADER,
+    PARENT_ID_HEADER,
     SAMPLED_ID_HEADER,
     SPAN_ID_HEADER,
     TRACE_ID_HEADER,
     TraceContext,
 )
 
-from .template import Headers
+from .template import Headers, RawHeaders
+
+_TRACE_ID = TRACE_ID_HEADER.lower().encode("latin-1")
+_SPAN_ID = SPAN_ID_HEADER.lower().encode("latin-1")
+_PARENT_ID = PARENT_ID_HEADER.lower().encode("latin-1")
+_SAMPLED = SAMPLED_ID_HEADER.lower().encode("latin-1")
+_FLAGS = FLAGS_HEADER.lower().encode("latin-1")
+_SINGLE = b"b3"
+_HEX = b"0123456789abcdef"
+_SAMPLED_STATES = b"01d"
+# size after the trace id -> separators of `-{span_id}[-{sampled}[-{parent_id}]]`
+_SEPARATORS = {17: b"-", 19: b"--", 36: b"---"}
+
+
+def parse_single_header(value: bytes) -> Optional[TraceContext]:
+    """
+    Parse `{trace_id}-{span_id}[-{sampled}[-{parent_id}]]` at fixed offsets,
+    `None` if the header is invalid or only carries the sampling decision.
+    Trace ids are 16 or 32 lowercase hex digits, span ids 16, the sampling
+    state is `0`, `1` or `d`.
+    """
+    size = len(value)
+    trace_end = 16 if size > 16 and value[16] == 45 else 32  # "-"
+    span_end = trace_end + 17
+    separators = _SEPARATORS.get(size - trace_end)
+    if (
+        separators is None
+        # only the separators are left once the hex digits are removed
+        or value.translate(None, _HEX) != separators
+        or value[trace_end] != 45
+        or (
+            size > span_end
+            and (value[span_end] != 45 or value[span_end + 1] not in _SAMPLED_STATES)
+        )
+        or (size > span_end + 2 and value[span_end + 2] != 45)
+    ):
+        return None
+    text = value.decode("latin-1")
+    sampled = None
+    debug = False
+    if size > span_end:
+        debug = text[span_end + 1] == "d"
+        sampled = debug or text[span_end + 1] == "1"
+    parent_id = text[span_end + 3 :] if size > span_end + 2 else None
+    span_id = text[trace_end + 1 : span_end]
+    return TraceContext(text[:trace_end], parent_id, span_id, sampled, debug, False)
 
 
 class B3Headers(Headers):
@@ -20,12 +66,73 @@ class B3Headers(Headers):
         SAMPLED_ID_HEADER.lower(),
         FLAGS_HEADER.lower(),
     ]
+    RAW_KEYS = frozenset([_TRACE_ID, _SPAN_ID, _PARENT_ID, _SAMPLED, _FLAGS, _SINGLE])
+    SINGLE_HEADER = "b3"
+
+    def __init__(self, **kwargs: Any):
+        # Optionally emit the single `b3` header instead of the
+        # `X-B3-*` headers, both forms are always read
+        self.single_header = bool(kwargs.get("single_header", False))
 
     def make_headers(self, context: TraceContext, response_headers: dict) -> dict:
-        return context.make_headers()
+        if not self.single_header:
+            return context.make_headers()
+
+        value = f"{context.trace_id}-{context.span_id}"
+        if context.debug:
+            value += "-d"
+        elif context.sampled is not None:
+            value += "-1" if context.sampled else "-0"
+        else:
+            # the parent id can only follow the sampling state
+            return {self.SINGLE_HEADER: value}
+        if context.parent_id is not None:
+            value += f"-{context.parent_id}"
+        return {self.SINGLE_HEADER: value}
 
     def make_context(self, headers: dict) -> dict:
+        if self.SINGLE_HEADER in headers:
+            return parse_single_header(  # type: ignore
+                headers[self.SINGLE_HEADER].encode("latin-1")
+            )
         return make_context(headers)
 
+    def extract_context(self, raw_headers: RawHeaders) -> Optional[TraceContext]:
+        found = {}
+        for key, value in raw_headers:
+            if key in self.RAW_KEYS:
+                found[key] = value
+        single = found.get(_SINGLE)
+        if single is not None:
+            # the single header takes precedence
+            context = parse_single_header(single)
+            if context is not None:
+                return context
+
+        trace_id = found.get(_TRACE_ID)
+        span_id = found.get(_SPAN_ID)
+        if not trace_id or not span_id:
+            return None
+
+        parent_id = found.get(_PARENT_ID)
+        sampled = found.get(_SAMPLED)
+        debug = found.get(_FLAGS) == b"1"
+        return TraceContext(
+            trace_id=trace_id.decode("latin-1"),
+            parent_id=parent_id.decode("latin-1") if parent_id else None,
+            span_id=span_id.decode("latin-1"),
+            sampled=True if debug else (sampled == b"1" if sampled else None),
+            debug=debug,
+            shared=False,
+        )
+
     def get_trace_id(self, headers: dict) -> Union[str, None]:
+        single = headers.get(self.SINGLE_HEADER)
+        if single is not None:
+            return single.split("-", 1)[0]
         return headers.get(self.TRACE_ID_HEADER)
+
+    def response_context(self, headers: Mapping[str, str]) -> Optional[TraceContext]:
+        if self.TRACE_ID_HEADER in headers or self.SINGLE_HEADER in headers:
+            return self.make_context(headers)  # type: ignore
+        return None
@@ -0,0 +1,100 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from aiozipkin.helpers import TraceContext
+from aiozipkin.span import SpanAbc
+from starlette.datastructures import MutableHeaders
+
+from .b3 import B3Headers
+from .template import Headers, RawHeaders
+
+# (trace id, index of the formatter) detected on the incoming request
+_detected_ctx_var: ContextVar[Optional[Tuple[str, int]]] = ContextVar(
+    "detected_formatter", default=None
+)
+
+
+def _instantiate(formatter: Any) -> Headers:
+    return formatter() if isinstance(formatter, type) else formatter
+
+
+class CompositeHeaders(Headers):
+    """
+    Several header formats at once, for services receiving mixed traffic.
+
+    `formatters` is an ordered list of formatter classes or instances. The
+    raw request headers are scanned once, each header is routed to the
+    formatter owning it and the first formatter (in order) finding a valid
+    context wins. Responses get the detected format back, or the first
+    formatter's for new traces - unless `inject` lists the formats to always
+    emit.
+    """
+
+    def __init__(
+        self,
+        formatters: Sequence[Union[type, Headers]] = (B3Headers,),
+        inject: Optional[Sequence[Union[type, Headers]]] = None,
+    ):
+        self.formatters = [_instantiate(formatter) for formatter in formatters]
+        self.inject = (
+            [_instantiate(formatter) for formatter in inject]
+            if inject is not None
+            else None
+        )
+        self.KEYS = [key for formatter in self.formatters for key in formatter.KEYS]
+        # raw header key -> index of the formatter owning it, first one wins
+        self._owners: Dict[bytes, int] = {}
+        for index, formatter in reversed(list(enumerate(self.formatters))):
+            self._owners.update(dict.fromkeys(formatter.RAW_KEYS, index))
+        self.RAW_KEYS = frozenset(self._owners)
+
+    def targets(self, trace_id: str) -> Sequence[Headers]:
+        """
+        Formatters used to emit the headers of the trace.
+        """
+        if self.inject is not None:
+            return self.inject
+        detected = _detected_ctx_var.get()
+        if detected is not None and detected[0] == trace_id:
+            return (self.formatters[detected[1]],)
+        return self.formatters[:1]
+
+    def make_headers(self, context: TraceContext, response_headers: dict) -> dict:
+        for formatter in self.targets(context.trace_id):
+            response_headers.update(formatter.make_headers(context, {}))
+        return response_headers
+
+    def make_context(self, headers: dict) -> Optional[TraceContext]:  # type: ignore
+        for formatter in self.formatters:
+            if formatter.TRACE_ID_HEADER in headers:
+                return formatter.make_context(headers)  # type: ignore
+        return None
+
+    def extract_context(self, raw_headers: RawHeaders) -> Optional[TraceContext]:
+        found: Dict[int, RawHeaders] = {}
+        owners = self._owners
+        for key, value in raw_headers:
+            index = owners.get(key)
+            if index is not None:
+                found.setdefault(index, []).append((key, value))
+        for index in sorted(found):
+            context = self.formatters[index].extract_context(found[index])
+            if context is not None:
+                if self.inject is None:
+                    _detected_ctx_var.set((context.trace_id, index))
+                return context
+        return None
+
+    def get_trace_id(self, headers: dict) -> Union[str, None]:
+        for formatter in self.formatters:
+            trace_id = formatter.get_trace_id(headers)
+            if trace_id is not None:
+                return trace_id
+        return None
+
+    def update_headers(self, span: SpanAbc, headers: MutableHeaders) -> None:
+        trace_id = span.context.trace_id
+        for formatter in self.targets(trace_id):
+            # only update headers if headers not already set for this trace_id
+            if formatter.get_trace_id(headers) != trace_id:  # type: ignore
+                headers.update(formatter.make_headers(span.context, {}))
@@ -1,14 +1,24 @@
 from abc import ABC, abstractmethod
-from typing import List, Union
+from typing import Any, FrozenSet, List, Mapping, Optional, Tuple, Union
 
 from aiozipkin.helpers import TraceContext
 from aiozipkin.span import SpanAbc
-from starlette.responses import Response
+from starlette.datastructures import MutableHeaders
+
+RawHeaders = List[Tuple[bytes, bytes]]
 
 
 class Headers(ABC):
     TRACE_ID_HEADER: str = ""
     KEYS: List = []
+    # lowercase byte keys matched against the raw ASGI headers,
+    # derived from `KEYS` unless set by the formatter
+    RAW_KEYS: FrozenSet[bytes] = frozenset()
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        if "RAW_KEYS" not in cls.__dict__:
+            cls.RAW_KEYS = frozenset(key.lower().encode("latin-1") for key in cls.KEYS)
 
     @abstractmethod
     def make_headers(self, context: TraceContext, response_headers: dict) -> dict:
@@ -22,13 +32,36 @@ class Headers(ABC):
     def get_trace_id(self, headers: dict) -> Union[str, None]:
         pass
 
-    def update_headers(self, span: SpanAbc, response: Response) -> None:
-        response_trace_id = self.get_trace_id(response.headers)
+    def extract_context(self, raw_headers: RawHeaders) -> Optional[TraceContext]:
+        """
+        Build the context straight from `scope["headers"]`.
+
+        Scans the raw header list once and decodes only the trace headers.
+        Formatters override this with a parser that skips `make_context`.
+        """
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in raw_headers
+            if key in self.RAW_KEYS
+        }
+        if self.TRACE_ID_HEADER not in headers:
+            return None
+        return self.make_context(headers)  # type: ignore
+
+    def response_context(self, headers: Mapping[str, str]) -> Optional[TraceContext]:
+        """
+        Decode the trace headers the application already set on the
+        response, once per response.
+        """
+        if self.TRACE_ID_HEADER not in headers:
+            return None
+        return self.make_context(headers)  # type: ignore
 
-        trace_headers = self.make_headers(span.context, response.headers)
+    def update_headers(self, span: SpanAbc, headers: MutableHeaders) -> None:
+        context = self.response_context(headers)
 
         # only update headers if headers not already set for this trace_id
         # ! need this check, since the default value is always context from
         # previous request
-        if response_trace_id != span.context.trace_id:
-            response.headers.update(trace_headers)
+        if context is None or context.trace_id != span.context.trace_id:
+            headers.update(self.make_headers(span.context, {}))
@@ -2,7 +2,7 @@
 https://www.jaegertracing.io/docs/1.7/client-libraries/
 https://github.com/aio-libs/aiozipkin/blob/v0.5.0/aiozipkin/helpers.py
 """
-from typing import Tuple, Union
+from typing import Mapping, Optional, Tuple, Union
 
 from aiozipkin.helpers import (
     FLAGS_HEADER,
@@ -12,8 +12,12 @@ from aiozipkin.helpers import (
 )
 from aiozipkin.helpers import TRACE_ID_HEADER as B3_TRACE_ID_HEADER
 from aiozipkin.helpers import TraceContext, make_context
+from aiozipkin.span import SpanAbc
+from starlette.datastructures import MutableHeaders
 
-from .template import Headers
+from .template import Headers, RawHeaders
+
+_TRACE_ID = b"uber-trace-id"
 
 
 class UberHeaders(Headers):
@@ -23,16 +27,9 @@ class UberHeaders(Headers):
     def __init__(self, **kwargs: dict):
         # Optinally can define what split character to use, default
         # "%3A" (representing ":")
-        self.split_char = kwargs.get("split_char", "%3A")
+        self.split_char = str(kwargs.get("split_char", "%3A"))
 
     def make_headers(self, context: TraceContext, response_headers: dict) -> dict:
-        # if headers already injected within whe application
-        # using the build in b3 format, set the context to
-        # the child context
-        if B3_TRACE_ID_HEADER in response_headers:
-            context = self.make_context(response_headers)
-            self._clean_b3_headers(response_headers)
-
         parent_span_id = context.parent_id if context.parent_id is not None else "0"
 
         # TODO: validate this is correct
@@ -69,27 +66,58 @@ class UberHeaders(Headers):
             return tc
         else:
             # create context from B3 headers - used as a shortcut
-            # for make_headers. It is NOT recommended to mix b3
+            # for update_headers. It is NOT recommended to mix b3
             # and uber-trace-id formats together, as it is untested
             return make_context(headers)
 
+    def extract_context(self, raw_headers: RawHeaders) -> Optional[TraceContext]:
+        for key, value in raw_headers:
+            if key == _TRACE_ID:
+                parts = value.decode("latin-1").split(self.split_char)
+                if len(parts) != 4:
+                    return None
+                trace_id, span_id, parent_id, debug, sampled = self._parse_parts(parts)
+                return TraceContext(
+                    trace_id=trace_id,
+                    parent_id=parent_id,
+                    span_id=span_id,
+                    sampled=sampled,
+                    debug=debug,
+                    shared=False,
+                )
+        return None
+
     def _parse_uber_headers(self, headers: dict) -> Tuple:
-        trace_id, span_id, parent_id, flags = headers[self.TRACE_ID_HEADER].split(
-            self.split_char
-        )
+        return self._parse_parts(headers[self.TRACE_ID_HEADER].split(self.split_char))
+
+    @staticmethod
+    def _parse_parts(parts: list) -> Tuple:
+        trace_id, span_id, parent_id, flags = parts
         debug = flags == "2"
         sampled = debug if debug else flags == "1"
         return trace_id, span_id, parent_id, debug, sampled
 
     def get_trace_id(self, headers: dict) -> Union[str, None]:
-        has_uber = self.TRACE_ID_HEADER in headers
-        if has_uber:
-            trace_id, span_id, parent_id, debug, sampled = self._parse_uber_headers(
-                headers
-            )
-            return trace_id
+        value = headers.get(self.TRACE_ID_HEADER)
+        return value.split(self.split_char, 1)[0] if value is not None else None
+
+    def response_context(self, headers: Mapping[str, str]) -> Optional[TraceContext]:
+        if self.TRACE_ID_HEADER in headers or B3_TRACE_ID_HEADER in headers:
+            return self.make_context(headers)  # type: ignore
+        return None
+
+    def update_headers(self, span: SpanAbc, headers: MutableHeaders) -> None:
+        context = self.response_context(headers)
+        if B3_TRACE_ID_HEADER in headers:
+            # if headers already injected within whe application
+            # using the build in b3 format, set the context to
+            # the child context
+            self._clean_b3_headers(headers)
+        elif context is not None and context.trace_id == span.context.trace_id:
+            return
         else:
-            return None
+            context = None
+        self.make_headers(context or span.context, headers)  # type: ignore
 
     @staticmethod
     def _clean_b3_headers(headers: dict) -> None:
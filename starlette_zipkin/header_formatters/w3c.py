@@ -0,0 +1,113 @@
+"""
+https://www.w3.org/TR/trace-context/
+"""
+from contextvars import ContextVar
+from typing import Any, Optional, Tuple, Union
+
+from aiozipkin.helpers import TraceContext
+
+from .template import Headers, RawHeaders
+
+_TRACEPARENT = b"traceparent"
+_TRACESTATE = b"tracestate"
+_HEX = b"0123456789abcdef"
+_SAMPLED = frozenset(b"13579bdf")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+_MAX_TRACESTATE_ENTRIES = 32
+
+# (trace id, tracestate) received with the request, propagated downstream
+_tracestate_ctx_var: ContextVar[Optional[Tuple[str, str]]] = ContextVar(
+    "tracestate", default=None
+)
+
+
+def parse_traceparent(value: bytes) -> Optional[TraceContext]:
+    """
+    Parse `version-trace_id-parent_id-flags` at fixed offsets,
+    `None` if the header is invalid.
+    """
+    size = len(value)
+    if (
+        size < 55
+        # only the three separators are left once the hex digits are removed
+        or value[:55].translate(None, _HEX) != b"---"
+        or value[2] != 45  # "-"
+        or value[35] != 45
+        or value[52] != 45
+    ):
+        return None
+    if value[:2] == b"00":
+        if size != 55:
+            return None
+    elif value[:2] == b"ff" or (size > 55 and value[55] != 45):
+        # future versions may append fields
+        return None
+    text = value.decode("latin-1")
+    trace_id = text[3:35]
+    span_id = text[36:52]
+    if trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    # the sampled flag is the lowest bit of the last hex digit
+    return TraceContext(trace_id, None, span_id, value[54] in _SAMPLED, False, False)
+
+
+class W3CHeaders(Headers):
+    TRACE_ID_HEADER = "traceparent"
+    KEYS = ["traceparent"]
+    RAW_KEYS = frozenset([_TRACEPARENT, _TRACESTATE])
+
+    def __init__(self, **kwargs: Any):
+        # Optionally add a `<tracestate_key>=<span id>` entry to the
+        # propagated `tracestate`
+        self.tracestate_key: Optional[str] = kwargs.get("tracestate_key")
+
+    def make_headers(self, context: TraceContext, response_headers: dict) -> dict:
+        flags = "01" if context.sampled or context.debug else "00"
+        headers = {
+            self.TRACE_ID_HEADER: f"00-{context.trace_id:0>32}-{context.span_id}-{flags}"
+        }
+        tracestate = self.make_tracestate(context)
+        if tracestate:
+            headers["tracestate"] = tracestate
+        response_headers.update(headers)
+
+        return response_headers
+
+    def make_tracestate(self, context: TraceContext) -> str:
+        received = _tracestate_ctx_var.get()
+        tracestate = received[1] if received and received[0] == context.trace_id else ""
+        if self.tracestate_key is None:
+            return tracestate
+
+        # the updated entry moves to the left, other vendors are kept
+        entries = [f"{self.tracestate_key}={context.span_id}"]
+        prefix = f"{self.tracestate_key}="
+        for entry in tracestate.split(","):
+            entry = entry.strip()
+            if entry and not entry.startswith(prefix):
+                entries.append(entry)
+        return ",".join(entries[:_MAX_TRACESTATE_ENTRIES])
+
+    def make_context(self, headers: dict) -> Optional[TraceContext]:  # type: ignore
+        return parse_traceparent(headers[self.TRACE_ID_HEADER].encode("latin-1"))
+
+    def extract_context(self, raw_headers: RawHeaders) -> Optional[TraceContext]:
+        traceparent = None
+        tracestate = []
+        for key, value in raw_headers:
+            if key == _TRACEPARENT:
+                traceparent = value
+            elif key == _TRACESTATE:
+                tracestate.append(value.decode("latin-1"))
+        if traceparent is None:
+            return None
+        context = parse_traceparent(traceparent)
+        if context is not None and tracestate:
+            # multiple headers are a single comma separated list
+            _tracestate_ctx_var.set((context.trace_id, ",".join(tracestate)))
+        return context
+
+    def get_trace_id(self, headers: dict) -> Union[str, None]:
+        value = headers.get(self.TRACE_ID_HEADER)
+        return value[3:35] if value is not None else None
@@ -0,0 +1,70 @@
+import os
+import time
+import weakref
+from typing import List
+
+_generators: "weakref.WeakSet[IdGenerator]" = weakref.WeakSet()
+
+
+class IdGenerator:
+    """
+    Trace and span ids cut from a pool of random bytes, refilled in bulk
+    with `pool_size` ids at a time, instead of one random call and one hex
+    format per id.
+
+    Trace ids have `trace_id_bits` (64 or 128) bits. 128 bit trace ids
+    start with the current epoch second, as those of `aiozipkin` do.
+    Taking an id is a single `list.pop`, which is safe to call from the
+    threads running sync endpoints. Pools are discarded in forked workers,
+    so they never hand out the ids of their parent.
+    """
+
+    def __init__(self, *, trace_id_bits: int = 128, pool_size: int = 1024) -> None:
+        if trace_id_bits not in (64, 128):
+            raise ValueError(f"Unsupported trace id size {trace_id_bits!r}")
+        self._random_width = 16 if trace_id_bits == 64 else 24
+        self._time_prefix = trace_id_bits == 128
+        self._pool_size = pool_size
+        self._span_ids: List[str] = []
+        self._trace_ids: List[str] = []
+        self._second = 0
+        self._prefix = ""
+        _generators.add(self)
+
+    def span_id(self) -> str:
+        try:
+            return self._span_ids.pop()
+        except IndexError:
+            self._span_ids = self._fill(16)
+            return self.span_id()
+
+    def trace_id(self) -> str:
+        try:
+            random_part = self._trace_ids.pop()
+        except IndexError:
+            self._trace_ids = self._fill(self._random_width)
+            return self.trace_id()
+        if self._time_prefix:
+            second = int(time.time())
+            if second != self._second:
+                self._prefix = f"{second:08x}"
+                self._second = second
+            return self._prefix + random_part
+        return random_part
+
+    def _fill(self, width: int) -> List[str]:
+        pool = os.urandom(self._pool_size * width // 2).hex()
+        return [pool[i : i + width] for i in range(0, len(pool), width)]
+
+    def _reset(self) -> None:
+        self._span_ids = []
+        self._trace_ids = []
+
+
+def _reset_after_fork() -> None:
+    for generator in list(_generators):
+        generator._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
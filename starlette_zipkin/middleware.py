@@ -1,89 +1,316 @@
+import asyncio
+import logging
+import random
 import socket
+import time
 import traceback
 import urllib
-from typing import Any, Callable
+from types import TracebackType
+from typing import Any, Dict, Optional, Tuple
 from urllib.parse import urlunparse
 
 import aiozipkin as az
 from aiozipkin.span import SpanAbc
-from starlette.applications import Starlette
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
-from starlette.responses import Response
-from starlette.types import Scope
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .config import ZipkinConfig
+from .encoding import JSON
+from .record import LazyTag
+from .registry import shared_tracers
+from .rules import EXCLUDED
+from .tail import TailSampler
 from .trace import install_root_span, install_tracer, reset_root_span, reset_tracer
+from .tracer import Tracer
 
+logger = logging.getLogger(__name__)
+
+
+class ZipkinMiddleware:
+    """
+    Pure ASGI middleware - wraps `send` instead of going through
+    `BaseHTTPMiddleware.call_next`, so the response is streamed through
+    untouched and only the `http.response.start` message is inspected.
+    """
 
-class ZipkinMiddleware(BaseHTTPMiddleware):
     tracer: az.Tracer
 
     def __init__(
         self,
-        app: Starlette,
-        dispatch: Callable = None,
+        app: ASGIApp,
         config: ZipkinConfig = None,
         _tracer: az.Tracer = None,  # dependency injection used for testing
     ):
-        super().__init__(app=app, dispatch=dispatch)
+        self.app = app
         self.config = config or ZipkinConfig()
         self.validate_config()
-        self.tracer = _tracer  # Initialized on first dispatch
+        self.tracer = _tracer  # Initialized on first request
+        self._injected_tracer = _tracer is not None
+        self.tail_sampler: Optional[TailSampler] = None
+        self.requests_sampled = 0
+        self.requests_unsampled = 0
+        self.overhead_seconds = 0.0
+        self.overhead_max_seconds = 0.0
+        self._stats_reported = time.monotonic()
+        self._init_lock: Optional[asyncio.Lock] = None
+        self._shared_reference = False
         self.host_ip = get_ip()
 
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.lifespan(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        sample_rate = self.config.path_rules.match(scope["path"])
+        if sample_rate == EXCLUDED:
+            await self.app(scope, receive, send)
+            return
+
+        if (
+            self.tracer is not None
+            and self.config.shared_tracer
+            and not shared_tracers.is_current(self.tracer_key(), self.tracer)
+        ):
+            # closed by the middleware holding the reference, on its shutdown
+            self.tracer = None
+            self.tail_sampler = None
         if self.tracer is None:
-            self.tracer = await self.init_tracer()
+            # not created on startup, the server does not run the lifespan
+            await self.ensure_tracer()
 
         tracer_token = install_tracer(self.tracer)
-        kw = {}
+        kw: Dict[str, Any] = {}
         function = self.tracer.new_trace
-        if self.has_trace_id(request) and not self.config.force_new_trace:
-            context = self.config.header_formatter.make_context(request.headers)
+        if sample_rate is not None:
+            kw = {"sampled": random.random() < sample_rate}
+        if not self.config.force_new_trace:
+            context = self.config.header_formatter.extract_context(scope["headers"])
             if context:
                 kw = {"context": context}
                 function = self.tracer.new_child
 
-        with function(**kw) as span:
-            # set root span using context variable
-            root_span = install_root_span(span)
-            try:
-                self.before(span, request.scope)
-                response = await call_next(request)
-                self.after(span, response)
+        span = function(**kw)
+        # time spent in the application, the rest is tracing overhead
+        app_seconds = 0.0
+        status_code = None
+        failed = False
+        try:
+            with span:
+                # set root span using context variable
+                root_span = install_root_span(span)
+                after_seconds = 0.0
+
+                async def send_wrapper(message: Message) -> None:
+                    nonlocal status_code, after_seconds
+                    if message["type"] == "http.response.start":
+                        status_code = message["status"]
+                        after_start = time.perf_counter()
+                        self.after(span, message)
+                        after_seconds += time.perf_counter() - after_start
+                    await send(message)
+
+                app_start = 0.0
+                try:
+                    # unsampled spans are never recorded, skip building the tags
+                    if not span.is_noop:
+                        self.before(span, scope)
+                        # upstream services made the decision for joined traces
+                        if span.context.parent_id is None:
+                            self.tag_sample_rate(span, sample_rate)
+                    app_start = time.perf_counter()
+                    await self.app(scope, receive, send_wrapper)
+
+                except Exception as error:
+                    failed = True
+                    if not span.is_noop:
+                        self.error(span, error)
+                    raise error from None
+
+                finally:
+                    if app_start:
+                        app_seconds = time.perf_counter() - app_start - after_seconds
+                    reset_root_span(root_span)
+                    reset_tracer(tracer_token)
+        finally:
+            # once the root span finished, so that its tags are buffered too
+            if self.tail_sampler is not None and not span.is_noop:
+                self.tail_sampler.decide(
+                    span.context.trace_id,
+                    time.perf_counter() - start,
+                    status_code,
+                    failed,
+                )
+            self.record_request(span.is_noop, time.perf_counter() - start - app_seconds)
+
+    async def lifespan(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Create the tracer on startup, close it once the application shut
+        down, so that the spans finished until then are flushed.
+        """
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.ensure_tracer(lifespan=True)
+                except Exception as exc:  # retried on the first request
+                    logger.error("Can not create the tracer", exc_info=exc)
+            return message
 
-                return response
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] in (
+                "lifespan.shutdown.complete",
+                "lifespan.shutdown.failed",
+            ):
+                await self.close_tracer()
+            await send(message)
 
-            except Exception as error:
-                self.error(span, error)
-                raise error from None
+        await self.app(scope, receive_wrapper, send_wrapper)
 
-            finally:
-                reset_root_span(root_span)
-                reset_tracer(tracer_token)
+    async def ensure_tracer(self, lifespan: bool = False) -> az.Tracer:
+        """
+        Single-flight tracer creation, concurrent first requests wait for
+        the same tracer. With `shared_tracer` the tracer comes from the
+        process-wide registry, created by the first middleware needing it;
+        only middleware receiving the lifespan events (and closing the tracer
+        on shutdown) hold a reference to it.
+        """
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if self.tracer is None:
+                if self.config.shared_tracer:
+                    tracer = await shared_tracers.acquire(
+                        self.tracer_key(),
+                        self.init_tracer,
+                        reference=lifespan,
+                        settings=self.tracer_settings(),
+                    )
+                    self._shared_reference = lifespan
+                    transport = tracer._transport
+                    if isinstance(transport, TailSampler):
+                        self.tail_sampler = transport
+                    self.tracer = tracer
+                else:
+                    self.tracer = await self.init_tracer()
+        return self.tracer
+
+    def tracer_key(self) -> Tuple[str, str]:
+        return (self.config.collector_url, self.config.service_name)
+
+    def tracer_settings(self) -> Dict[str, Any]:
+        """
+        Configuration of the shared tracer, only applied by its creator.
+        """
+        config = self.config
+        return {
+            "sampler": type(config.sampler),
+            "sample_rate": config.sample_rate,
+            "transport": config.transport,
+            "transport_kwargs": config.transport_kwargs,
+            "tail_sampler": config.tail_sampler,
+            "tail_sampler_kwargs": config.tail_sampler_kwargs,
+            "encoding": config.encoding,
+        }
+
+    async def close_tracer(self) -> None:
+        """
+        Close the tracer and forget it, so that the next lifespan or request
+        creates a new one. An injected tracer is closed but kept.
+        """
+        tracer = self.tracer
+        if tracer is None:
+            return
+        if not self._injected_tracer:
+            self.tracer = None
+            self.tail_sampler = None
+        if self.config.shared_tracer:
+            # closed by the last middleware holding a reference
+            if not self._shared_reference:
+                return
+            self._shared_reference = False
+            tracer = shared_tracers.release(self.tracer_key())
+            if tracer is None:
+                return
+        try:
+            await asyncio.wait_for(tracer.close(), self.config.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Spans not flushed within %s seconds", self.config.shutdown_timeout
+            )
+        except Exception as exc:  # that code should never break the application
+            logger.error("Can not close the tracer", exc_info=exc)
 
     async def init_tracer(self) -> az.Tracer:
         endpoint = az.create_endpoint(self.config.service_name)
-        tracer = await az.create(
-            f"http://{self.config.host}:{self.config.port}/api/v2/spans",
+        transport_kwargs = self.config.transport_kwargs
+        if self.config.encoding != JSON:
+            # custom transports predating the option keep working with JSON
+            transport_kwargs = {"encoding": self.config.encoding, **transport_kwargs}
+        transport = self.config.transport(self.config.collector_url, **transport_kwargs)
+        if self.config.tail_sampler is not None:
+            transport = self.tail_sampler = self.config.tail_sampler(
+                transport, **self.config.tail_sampler_kwargs
+            )
+        return Tracer(
+            transport,
+            self.config.sampler,
             endpoint,
-            sample_rate=self.config.sample_rate,
+            id_generator=self.config.id_generator,
         )
-        return tracer
+
+    def record_request(self, unsampled: bool, overhead: float) -> None:
+        if unsampled:
+            self.requests_unsampled += 1
+        else:
+            self.requests_sampled += 1
+        self.overhead_seconds += overhead
+        if overhead > self.overhead_max_seconds:
+            self.overhead_max_seconds = overhead
+
+        callback = self.config.stats_callback
+        if callback is not None:
+            now = time.monotonic()
+            if now - self._stats_reported >= self.config.stats_interval:
+                self._stats_reported = now
+                try:
+                    callback(self.stats())
+                except Exception as exc:  # that code should never break the app
+                    logger.error("Stats callback failed", exc_info=exc)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Snapshot of the counters and timings of the tracing pipeline, merged
+        with those of the tracer and of the transport when they have any.
+        """
+        requests = self.requests_sampled + self.requests_unsampled
+        stats: Dict[str, float] = {
+            "requests": requests,
+            "requests_sampled": self.requests_sampled,
+            "requests_unsampled": self.requests_unsampled,
+            "overhead_seconds": self.overhead_seconds,
+            "overhead_mean_seconds": self.overhead_seconds / requests
+            if requests
+            else 0.0,
+            "overhead_max_seconds": self.overhead_max_seconds,
+        }
+        if self.tracer is not None:
+            for name in ("spans_created", "spans_sampled"):
+                if hasattr(self.tracer, name):
+                    stats[name] = getattr(self.tracer, name)
+            transport = self.tracer._transport
+            if hasattr(transport, "stats"):
+                stats.update(transport.stats())
+        return stats
 
     def validate_config(self) -> None:
         if not isinstance(self.config, ZipkinConfig):
             raise ValueError("Config needs to be ZipkinConfig instance")
 
-    def has_trace_id(self, request: Request) -> bool:
-        if self.config.header_formatter.TRACE_ID_HEADER in request.headers:
-            return True
-        else:
-            return False
-
     def before(self, span: SpanAbc, scope: Scope) -> None:
         name = f'{scope["scheme"].upper()} {scope["method"]} {scope["path"]}'
         span.name(name)
@@ -92,10 +319,13 @@ class ZipkinMiddleware(BaseHTTPMiddleware):
         span.kind(az.SERVER)
 
         if scope["type"] in {"http", "websocket"}:
+            # routing mutates the scope, the lazy tags get their own copy
+            scope_copy = dict(scope)
             span.tag("http.method", scope["method"])
-            span.tag("http.url", self.get_url(scope))
+            span.tag("http.url", LazyTag(self.get_url, scope_copy))
             span.tag("http.route", scope["path"])
-            span.tag("http.headers", self.get_headers(scope))
+            if self.config.header_rules.enabled:
+                span.tag("http.headers", LazyTag(self.get_headers, scope_copy))
         query = self.get_query(scope)
         if query:
             span.tag("query", query)
@@ -104,21 +334,38 @@ class ZipkinMiddleware(BaseHTTPMiddleware):
         if scope.get("endpoint"):
             span.tag("transaction", self.get_transaction(scope))
 
-    def after(self, span: SpanAbc, response: Response) -> None:
+    def tag_sample_rate(self, span: SpanAbc, sample_rate: Optional[float]) -> None:
+        """
+        Effective sample rate of the route, or of a sampler exposing `rate`,
+        so that span counts can be re-weighted.
+        """
+        if sample_rate is None:
+            sample_rate = getattr(self.tracer._sampler, "rate", None)
+        if sample_rate is not None:
+            span.tag("sampler.rate", sample_rate)
+
+    def after(self, span: SpanAbc, message: Message) -> None:
         """
         If context header not filled in by other function,
         add tracing info.
         """
+        message.setdefault("headers", [])
+        headers = MutableHeaders(scope=message)
         if self.config.inject_response_headers:
-            self.config.header_formatter.update_headers(span, response)
+            # unsampled traces still propagate the sampling decision
+            self.config.header_formatter.update_headers(span, headers)
+        if span.is_noop:
+            return
 
-        span.tag("http.status_code", response.status_code)
-        if response.status_code >= 400:
+        status_code = message["status"]
+        span.tag("http.status_code", status_code)
+        if status_code >= 400:
             span.tag("error", True)
-        span.tag(
-            "http.response.headers",
-            self.config.json_encoder(dict(response.headers)),
-        )
+        if self.config.header_rules.enabled:
+            span.tag(
+                "http.response.headers",
+                LazyTag(self.get_response_headers, list(message["headers"])),
+            )
         # getting body after request was evaluated due to:
         # https://github.com/encode/starlette/issues/495
         # body = await request.body()
@@ -131,7 +378,10 @@ class ZipkinMiddleware(BaseHTTPMiddleware):
     def error(self, span: SpanAbc, error: Exception) -> None:
         span.tag("error", True)
         span.tag("error.object", type(error).__name__)
-        span.tag("error.stack", traceback.format_exc())
+        span.tag(
+            "error.stack",
+            LazyTag(self.get_stack, type(error), error, error.__traceback__),
+        )
 
     def get_url(self, scope: Scope) -> str:
         host, port = scope["server"]
@@ -147,19 +397,32 @@ class ZipkinMiddleware(BaseHTTPMiddleware):
         )
         return url
 
-    def get_headers(self, scope: Scope) -> dict:
+    def get_headers(self, scope: Scope) -> str:
         """
         Extract headers from the ASGI scope.
         """
-        headers: dict = {}
-        for raw_key, raw_value in scope["headers"]:
-            key = raw_key.decode("latin-1")
-            value = raw_value.decode("latin-1")
-            if key in headers:
-                headers[key] = headers[key] + ", " + value
-            else:
-                headers[key] = value
-        return self.config.json_encoder(headers)
+        return self.encode_headers(scope["headers"])
+
+    def get_response_headers(self, raw_headers: list) -> str:
+        """
+        Encode headers of the `http.response.start` message.
+        """
+        return self.encode_headers(raw_headers)
+
+    def encode_headers(self, raw_headers: list) -> str:
+        """
+        Captured headers as a JSON tag, according to `config.header_rules`.
+        """
+        rules = self.config.header_rules
+        return rules.truncate(self.config.json_encoder(rules.select(raw_headers)))
+
+    def get_stack(
+        self, error_type: type, error: BaseException, tb: Optional[TracebackType]
+    ) -> str:
+        """
+        Format the traceback captured when the error was raised.
+        """
+        return "".join(traceback.format_exception(error_type, error, tb))
 
     def get_query(self, scope: Scope) -> str:
         """
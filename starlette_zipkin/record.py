@@ -0,0 +1,160 @@
+import logging
+from sys import intern
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from aiozipkin.record import Record as BaseRecord
+
+logger = logging.getLogger(__name__)
+
+
+class LazyTag:
+    """
+    Tag value rendered only when the span is serialized for export.
+
+    Holds a cheap reference (raw header list, exception, ...) and the
+    function turning it into a string, so that the formatting work is
+    moved off the request path and skipped for spans that are dropped.
+    A failing render is logged and replaced by a placeholder, so that it
+    does not take the rest of the batch down with it.
+    """
+
+    __slots__ = ("_render", "_args")
+
+    def __init__(self, render: Callable[..., str], *args: Any) -> None:
+        self._render = render
+        self._args = args
+
+    def __str__(self) -> str:
+        try:
+            return str(self._render(*self._args))
+        except Exception as exc:  # rendered at export, far from the request
+            logger.warning("Can not render tag", exc_info=exc)
+            return f"<{type(exc).__name__}>"
+
+
+class Record(BaseRecord):
+    """
+    `aiozipkin` record keeping `LazyTag` values as they are until `asdict`.
+    """
+
+    _tags: Dict[str, Any]
+
+    def set_tag(self, key: str, value: Any) -> "Record":
+        self._tags[key] = value if isinstance(value, LazyTag) else str(value)
+        return self
+
+    def asdict(self) -> Dict[str, Any]:
+        # render once and drop the references held by the lazy tags
+        self._tags = {key: str(value) for key, value in self._tags.items()}
+        return super().asdict()
+
+
+_SHARED_MAX_COUNT = 1024
+_endpoints: Dict[Tuple[Tuple[str, Any], ...], Dict[str, Any]] = {}
+_tag_keys: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _shared_endpoint(endpoint: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # every aiozipkin record holds its own copy of the same endpoint dict
+    if endpoint is None:
+        return None
+    key = tuple(endpoint.items())
+    shared = _endpoints.get(key)
+    if shared is None:
+        if len(_endpoints) >= _SHARED_MAX_COUNT:
+            return endpoint
+        shared = _endpoints[key] = endpoint
+    return shared
+
+
+def _shared_tag_keys(keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    # spans of one endpoint are tagged with the same keys in the same order
+    shared = _tag_keys.get(keys)
+    if shared is None:
+        shared = tuple(intern(key) for key in keys)
+        if len(_tag_keys) < _SHARED_MAX_COUNT:
+            _tag_keys[shared] = shared
+    return shared
+
+
+class SpanRecord(NamedTuple):
+    """
+    Compact finished span, kept between span finish and serialization.
+
+    A tuple without per-instance `__dict__`. Tag keys are interned and
+    stored as a tuple shared by all spans with the same keys, only the tag
+    values are stored per span. Endpoint dicts are shared as well. Plain
+    enough to be pickled into another process.
+    """
+
+    trace_id: str
+    parent_id: Optional[str]
+    span_id: str
+    name: str
+    kind: Optional[str]
+    timestamp: Optional[int]
+    duration: Optional[int]
+    debug: bool
+    shared: bool
+    local_endpoint: Optional[Dict[str, Any]]
+    remote_endpoint: Optional[Dict[str, Any]]
+    annotations: Tuple[Tuple[str, int], ...]
+    tag_keys: Tuple[str, ...]
+    tag_values: Tuple[Any, ...]
+
+    @classmethod
+    def from_record(cls, record: BaseRecord, render: bool = False) -> "SpanRecord":
+        """
+        Copy a finished record. Lazy tags are kept as they are unless
+        `render` is set, which is needed when the span leaves the process.
+        """
+        context = record.context
+        tags = record._tags
+        values = tuple(tags.values())
+        if render:
+            values = tuple(str(value) for value in values)
+        return cls(
+            context.trace_id,
+            context.parent_id,
+            context.span_id,
+            record._name,
+            record._kind,
+            record._timestamp,
+            record._duration,
+            context.debug,
+            context.shared,
+            _shared_endpoint(record._local_endpoint),
+            _shared_endpoint(record._remote_endpoint),
+            tuple((a.value, a.timestamp) for a in record._annotations),
+            _shared_tag_keys(tuple(tags)),
+            values,
+        )
+
+    @property
+    def tags(self) -> Dict[str, str]:
+        return {key: str(value) for key, value in zip(self.tag_keys, self.tag_values)}
+
+    def asdict(self) -> Dict[str, Any]:
+        """
+        Zipkin v2 representation, same as `Record.asdict`.
+        """
+        data = {
+            "traceId": self.trace_id,
+            "name": self.name,
+            "parentId": self.parent_id,
+            "id": self.span_id,
+            "kind": self.kind,
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "debug": self.debug,
+            "shared": self.shared,
+            "localEndpoint": self.local_endpoint,
+            "remoteEndpoint": self.remote_endpoint,
+            "annotations": [
+                {"value": value, "timestamp": ts} for value, ts in self.annotations
+            ],
+            "tags": self.tags,
+        }
+        if self.kind is None:
+            del data["kind"]
+        return data
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import aiozipkin as az
+
+logger = logging.getLogger(__name__)
+
+# (collector url, service name)
+TracerKey = Tuple[str, str]
+
+
+class _Entry:
+    __slots__ = ("loop", "task", "tracer", "references", "settings")
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        task: "asyncio.Task",
+        settings: Dict[str, Any],
+    ) -> None:
+        self.loop = loop
+        self.task = task
+        self.tracer: Optional[az.Tracer] = None
+        self.references = 0
+        self.settings = settings
+
+
+class TracerRegistry:
+    """
+    Tracers shared across the middleware instances of the process, one per
+    collector url and service name, so that mounted applications reuse the
+    same transport, connection pool and batches.
+
+    The first `acquire` of a key creates the tracer with its `factory`,
+    concurrent callers wait for the same tracer. Tracers are reference
+    counted, `release` hands the tracer back to the caller to close once the
+    last reference is released. Callers which can not release it (mounted
+    applications do not get the lifespan events) acquire it with
+    `reference=False`. Tracers are bound to the event loop they were
+    created in, a key acquired from another loop gets a new tracer.
+
+    The tracer keeps the `settings` of its creator, a warning is logged when
+    a later caller acquires it with different ones.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[TracerKey, _Entry] = {}
+
+    async def acquire(
+        self,
+        key: TracerKey,
+        factory: Callable[[], Awaitable[az.Tracer]],
+        reference: bool = True,
+        settings: Optional[Dict[str, Any]] = None,
+    ) -> az.Tracer:
+        loop = asyncio.get_running_loop()
+        settings = settings or {}
+        entry = self._entries.get(key)
+        if entry is None or entry.loop is not loop:
+            task = loop.create_task(factory())  # type: ignore
+            entry = _Entry(loop, task, settings)
+            self._entries[key] = entry
+        else:
+            conflicts = sorted(
+                name
+                for name in settings.keys() & entry.settings.keys()
+                if settings[name] != entry.settings[name]
+            )
+            if conflicts:
+                logger.warning(
+                    "Shared tracer of %s for %s was created with a different %s, "
+                    "the shared tracer is used as is",
+                    key[1],
+                    key[0],
+                    ", ".join(conflicts),
+                )
+        try:
+            # a cancelled caller must not cancel the creation for the others
+            tracer = await asyncio.shield(entry.task)
+        except Exception:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            raise
+        entry.tracer = tracer
+        if reference:
+            entry.references += 1
+        return tracer
+
+    def release(self, key: TracerKey) -> Optional[az.Tracer]:
+        """
+        Drop a reference, return the tracer to close if it was the last one.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.references == 0:
+            return None
+        entry.references -= 1
+        if entry.references > 0:
+            return None
+        del self._entries[key]
+        return entry.task.result()
+
+    def is_current(self, key: TracerKey, tracer: az.Tracer) -> bool:
+        """
+        Whether `tracer` is still the open tracer of the key in the running
+        loop. Once the last reference is released it is closed, callers
+        which acquired it without a reference must acquire it again.
+        """
+        entry = self._entries.get(key)
+        return (
+            entry is not None
+            and entry.tracer is tracer
+            and entry.loop is asyncio.get_running_loop()
+        )
+
+    def get(self, collector_url: str, service_name: str) -> Optional[az.Tracer]:
+        """
+        Shared tracer of the service, e.g. to `install_tracer` it for `trace`
+        users running outside of a request.
+        """
+        entry = self._entries.get((collector_url, service_name))
+        if entry is None or not entry.task.done() or entry.task.exception():
+            return None
+        return entry.task.result()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+shared_tracers = TracerRegistry()
@@ -0,0 +1,277 @@
+"""
+Per-host span relay - aggregates the batches written by the `RelayTransport`
+of every worker on the host to a Unix domain socket, and uploads them to the
+collector.
+
+    starlette-zipkin-relay --socket /tmp/starlette-zipkin.sock \\
+        --collector http://localhost:9411/api/v2/spans
+"""
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import signal
+import stat
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Set
+
+import aiohttp
+from aiohttp.client_exceptions import ClientError
+
+from .encoding import GZIP_LEVEL, JSON, JSON_GZIP, PROTO3, get_encoding
+from .transports.relay import DEFAULT_SOCKET_PATH, FRAME_ENCODINGS, FRAME_HEADER
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTOR = "http://localhost:9411/api/v2/spans"
+
+
+class SpanRelay:
+    """
+    Unix domain socket server receiving span batches framed by
+    `RelayTransport`.
+
+    Batches are merged into uploads of up to `max_batch_bytes` in the
+    encoding the workers chose, sent when that size is reached or every
+    `flush_interval` seconds. JSON lists and proto3 messages are merged
+    without being decoded, gzip batches are decompressed and compressed
+    again as a whole. When the collector can not keep up and
+    `max_pending_bytes` are waiting, the oldest batches are dropped.
+    """
+
+    def __init__(
+        self,
+        socket_path: str = DEFAULT_SOCKET_PATH,
+        address: str = DEFAULT_COLLECTOR,
+        *,
+        max_batch_bytes: int = 1 << 20,
+        max_pending_bytes: int = 64 << 20,
+        flush_interval: float = 1,
+        send_timeout: float = 30,
+    ) -> None:
+        self._socket_path = socket_path
+        self._address = address
+        self._max_batch_bytes = max_batch_bytes
+        self._max_pending_bytes = max_pending_bytes
+        self._flush_interval = flush_interval
+        self._send_timeout = send_timeout
+        # encoding -> batches, gzip ones are kept decompressed
+        self._pending: Dict[str, Deque[bytes]] = {
+            encoding: deque() for encoding in FRAME_ENCODINGS
+        }
+        self._pending_bytes = 0
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._handlers: Set["asyncio.Task[Any]"] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._closing = False
+
+        self.batches_received = 0
+        self.batches_dropped = 0
+        self.batches_invalid = 0
+        self.uploads = 0
+        self.uploads_failed = 0
+        self.bytes_sent = 0
+        self.flush_seconds = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches_received": self.batches_received,
+            "batches_dropped": self.batches_dropped,
+            "batches_invalid": self.batches_invalid,
+            "pending_bytes": self._pending_bytes,
+            "connections": len(self._writers),
+            "uploads": self.uploads,
+            "uploads_failed": self.uploads_failed,
+            "bytes_sent": self.bytes_sent,
+            "flush_seconds": self.flush_seconds,
+        }
+
+    async def start(self) -> None:
+        await self._remove_stale_socket()
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self._send_timeout)
+        )
+        self._batch_ready = asyncio.Event()
+        self._flusher = asyncio.ensure_future(self._flush_loop())
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=self._socket_path
+        )
+
+    async def _remove_stale_socket(self) -> None:
+        """
+        Remove the socket left by a relay which did not shut down cleanly,
+        refuse to start when a running relay still listens on it.
+        """
+        try:
+            mode = os.lstat(self._socket_path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise RuntimeError(f"{self._socket_path} exists and is not a socket")
+        try:
+            _, writer = await asyncio.open_unix_connection(self._socket_path)
+        except ConnectionRefusedError:
+            os.unlink(self._socket_path)
+            return
+        writer.close()
+        raise RuntimeError(f"A relay is already listening on {self._socket_path}")
+
+    async def close(self) -> None:
+        if self._closing or self._server is None:
+            return
+        self._closing = True
+        self._server.close()
+        # workers keep their connection open, `wait_closed` waits for them
+        for writer in list(self._writers):
+            writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+        self._batch_ready.set()
+        await self._flusher
+        await self._flush()
+        await self._session.close()
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        handler = asyncio.current_task()
+        if handler is not None:
+            self._handlers.add(handler)
+        self._writers.add(writer)
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                size, index = FRAME_HEADER.unpack(header)
+                if size > self._max_pending_bytes or index >= len(FRAME_ENCODINGS):
+                    logger.warning("Closing the connection of an invalid batch")
+                    break
+                self.receive(await reader.readexactly(size), FRAME_ENCODINGS[index])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # the worker disconnected
+        finally:
+            self._handlers.discard(handler)
+            self._writers.discard(writer)
+            writer.close()
+
+    def receive(self, batch: bytes, encoding: str = JSON) -> None:
+        self.batches_received += 1
+        if encoding == JSON_GZIP:
+            try:
+                batch = gzip.decompress(batch)
+            except (OSError, EOFError):
+                self.batches_invalid += 1
+                return
+        if encoding != PROTO3 and not (batch.startswith(b"[") and batch.endswith(b"]")):
+            self.batches_invalid += 1
+            return
+        if len(batch) <= 2:  # empty list or message
+            return
+        self._pending[encoding].append(batch)
+        self._pending_bytes += len(batch)
+        while self._pending_bytes > self._max_pending_bytes:
+            pending = next(batches for batches in self._pending.values() if batches)
+            self._pending_bytes -= len(pending.popleft())
+            self.batches_dropped += 1
+        if self._pending_bytes >= self._max_batch_bytes:
+            self._batch_ready.set()
+
+    async def _flush_loop(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self._flush()
+
+    async def _flush(self) -> None:
+        for encoding, pending in self._pending.items():
+            while pending:
+                batches = [pending.popleft()]
+                size = len(batches[0])
+                while pending and size + len(pending[0]) <= self._max_batch_bytes:
+                    batches.append(pending.popleft())
+                    size += len(batches[-1])
+                self._pending_bytes -= size
+                await self._upload(merge(batches, encoding), encoding)
+
+    async def _upload(self, data: bytes, encoding: str = JSON) -> None:
+        start = time.perf_counter()
+        headers = get_encoding(encoding)[1]
+        try:
+            async with self._session.post(
+                self._address, data=data, headers=headers
+            ) as resp:
+                sent = resp.status < 300
+                if not sent:
+                    logger.warning(
+                        "zipkin responded with code: %s and body: %s",
+                        resp.status,
+                        await resp.text(),
+                    )
+        except (asyncio.TimeoutError, ClientError):
+            sent = False
+        except Exception as exc:  # the relay keeps running
+            logger.error("Can not send spans to zipkin", exc_info=exc)
+            sent = False
+        self.flush_seconds += time.perf_counter() - start
+        self.uploads += 1
+        if sent:
+            self.bytes_sent += len(data)
+        else:
+            self.uploads_failed += 1
+
+
+def merge(batches: List[bytes], encoding: str = JSON) -> bytes:
+    """
+    Single payload of the batches. JSON lists are concatenated without being
+    decoded, so are `ListOfSpans` messages (repeated fields are appended).
+    """
+    if encoding == PROTO3:
+        return b"".join(batches)
+    merged = b"[" + b",".join(batch[1:-1] for batch in batches) + b"]"
+    if encoding == JSON_GZIP:
+        return gzip.compress(merged, compresslevel=GZIP_LEVEL)
+    return merged
+
+
+async def serve(relay: SpanRelay) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await relay.start()
+    logger.info("Relaying spans from %s", relay._socket_path)
+    try:
+        await stop.wait()
+    finally:
+        await relay.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--collector", default=DEFAULT_COLLECTOR)
+    parser.add_argument("--max-batch-bytes", type=int, default=1 << 20)
+    parser.add_argument("--max-pending-bytes", type=int, default=64 << 20)
+    parser.add_argument("--flush-interval", type=float, default=1)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level)
+    relay = SpanRelay(
+        args.socket,
+        args.collector,
+        max_batch_bytes=args.max_batch_bytes,
+        max_pending_bytes=args.max_pending_bytes,
+        flush_interval=args.flush_interval,
+    )
+    asyncio.run(serve(relay))
+
+
+if __name__ == "__main__":
+    main()
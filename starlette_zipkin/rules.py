@@ -0,0 +1,112 @@
+import re
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# returned by `PathRules.match` for paths that must not be traced at all
+EXCLUDED = -1.0
+
+
+class PathRules:
+    """
+    Path exclusions and per-route sample rates compiled into a single regex.
+
+    Patterns are regular expressions matched at the start of the request
+    path (`"/health"` also matches `"/healthz"`, use `"/health$"` for an
+    exact match). The first matching pattern wins, exclusions take
+    precedence over sample rates.
+    """
+
+    def __init__(
+        self,
+        exclude: Sequence[str] = (),
+        sample_rates: Mapping[str, float] = {},
+    ) -> None:
+        rules: List[Tuple[str, float]] = [(pattern, EXCLUDED) for pattern in exclude]
+        rules.extend(sample_rates.items())
+        self._rates = [rate for _, rate in rules]
+        self._regex = (
+            re.compile(
+                "|".join(
+                    f"(?P<_rule{index}>{pattern})"
+                    for index, (pattern, _) in enumerate(rules)
+                )
+            )
+            if rules
+            else None
+        )
+
+    def match(self, path: str) -> Optional[float]:
+        """
+        Sample rate for the path, `EXCLUDED`, or `None` if no rule matches.
+        """
+        if self._regex is None:
+            return None
+        match = self._regex.match(path)
+        if match is None:
+            return None
+        return self._rates[int(match.lastgroup[5:])]  # type: ignore
+
+
+DEFAULT_REDACTED_HEADERS = [
+    "authorization",
+    "proxy-authorization",
+    "cookie",
+    "set-cookie",
+]
+REDACTED = "[redacted]"
+TRUNCATED = "..."
+
+
+def _raw_keys(names: Iterable[str]) -> FrozenSet[bytes]:
+    return frozenset(name.lower().encode("latin-1") for name in names)
+
+
+class HeaderRules:
+    """
+    Headers captured into the `http.headers` and `http.response.headers`
+    tags, compiled into sets of raw header keys matched against the ASGI
+    headers before anything is decoded.
+
+    Only the `allow` headers are captured (all when `None`), except the
+    `deny` ones. Values of the `redact` headers are replaced, and tags
+    longer than `max_length` characters are truncated.
+    """
+
+    def __init__(
+        self,
+        allow: Optional[Iterable[str]] = None,
+        deny: Iterable[str] = (),
+        redact: Iterable[str] = DEFAULT_REDACTED_HEADERS,
+        max_length: Optional[int] = None,
+    ) -> None:
+        self._allowed = _raw_keys(allow) if allow is not None else None
+        self._denied = _raw_keys(deny)
+        self._redacted = _raw_keys(redact)
+        self.max_length = max_length
+
+    @property
+    def enabled(self) -> bool:
+        """
+        `False` when no header can be captured, the tags are skipped.
+        """
+        return self._allowed is None or bool(self._allowed - self._denied)
+
+    def select(self, raw_headers: Iterable[Tuple[bytes, bytes]]) -> Dict[str, str]:
+        allowed, denied, redacted = self._allowed, self._denied, self._redacted
+        headers: Dict[str, str] = {}
+        for raw_key, raw_value in raw_headers:
+            raw_key = raw_key.lower()
+            if raw_key in denied or (allowed is not None and raw_key not in allowed):
+                continue
+            key = raw_key.decode("latin-1")
+            if raw_key in redacted:
+                headers[key] = REDACTED
+            elif key in headers:
+                headers[key] = headers[key] + ", " + raw_value.decode("latin-1")
+            else:
+                headers[key] = raw_value.decode("latin-1")
+        return headers
+
+    def truncate(self, tag: str) -> str:
+        if self.max_length is None or len(tag) <= self.max_length:
+            return tag
+        return tag[: max(self.max_length - len(TRUNCATED), 0)] + TRUNCATED
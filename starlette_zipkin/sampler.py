@@ -0,0 +1,106 @@
+import time
+from random import Random
+from typing import Optional
+
+from aiozipkin.sampler import SamplerABC
+
+# trace ids are compared on their lower 64 bits
+_MAX_ID = 1 << 64
+
+
+class RateLimitingSampler(SamplerABC):
+    """
+    Token bucket sampler - at most `traces_per_second` new traces are sampled
+    per second in this process, with bursts of up to `max_burst` traces.
+
+    When the bucket is empty, traces are still sampled with the `floor_rate`
+    probability, so that some traffic stays visible during a surge. Keep it
+    low, it is the only part of the export volume growing with traffic.
+    """
+
+    def __init__(
+        self,
+        *,
+        traces_per_second: float,
+        max_burst: Optional[float] = None,
+        floor_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self._rate = traces_per_second
+        self._max_burst = (
+            max_burst if max_burst is not None else max(traces_per_second, 1)
+        )
+        self._floor_rate = floor_rate
+        self._rng = Random(seed)
+        self._clock = time.monotonic
+        self._tokens = self._max_burst
+        self._last = self._clock()
+
+    def is_sampled(self, trace_id: str) -> bool:
+        now = self._clock()
+        self._tokens = min(
+            self._max_burst, self._tokens + (now - self._last) * self._rate
+        )
+        self._last = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return self._floor_rate > 0 and self._rng.random() < self._floor_rate
+
+
+class AdaptiveSampler(SamplerABC):
+    """
+    Probabilistic sampler adjusting its rate to sample about
+    `traces_per_second` new traces per second in this process.
+
+    The request rate is measured every `interval` seconds and smoothed with
+    an exponential moving average (`smoothing` is the weight of the latest
+    measurement). The decision is a threshold on the lower 64 bits of the
+    trace id, so services using the same rate agree on the same traces.
+    The current probability is available as `rate`, the middleware tags it
+    on sampled root spans as `sampler.rate`.
+    """
+
+    def __init__(
+        self,
+        *,
+        traces_per_second: float,
+        interval: float = 1.0,
+        smoothing: float = 0.3,
+        initial_rate: float = 1.0,
+    ) -> None:
+        self._target = traces_per_second
+        self._interval = interval
+        self._smoothing = smoothing
+        self._clock = time.monotonic
+        self._requests = 0
+        self._request_rate: Optional[float] = None
+        self._window_start = self._clock()
+        self._set_rate(initial_rate)
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def is_sampled(self, trace_id: str) -> bool:
+        now = self._clock()
+        elapsed = now - self._window_start
+        if elapsed >= self._interval:
+            self._update(self._requests / elapsed)
+            self._requests = 0
+            self._window_start = now
+        self._requests += 1
+        return int(trace_id[-16:], 16) < self._threshold
+
+    def _update(self, request_rate: float) -> None:
+        if self._request_rate is not None:
+            request_rate = (
+                self._smoothing * request_rate
+                + (1 - self._smoothing) * self._request_rate
+            )
+        self._request_rate = request_rate
+        self._set_rate(self._target / request_rate if request_rate > 0 else 1.0)
+
+    def _set_rate(self, rate: float) -> None:
+        self._rate = min(max(rate, 0.0), 1.0)
+        self._threshold = int(self._rate * _MAX_ID)
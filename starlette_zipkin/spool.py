@@ -0,0 +1,190 @@
+import mmap
+import os
+import struct
+import zlib
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - windows
+    fcntl = None  # type: ignore
+
+_MAGIC = b"SZSPOOL1"
+_HEADER_SIZE = 128
+# generation, head, tail, crc32 of the three
+_SLOT = struct.Struct("<QQQI")
+_SLOT_OFFSETS = (16, 16 + _SLOT.size)
+_CAPACITY = struct.Struct("<Q")
+# payload size, crc32 of the payload
+_RECORD = struct.Struct("<II")
+_PADDING = 0xFFFFFFFF
+
+
+class SpanSpool:
+    """
+    Fixed-size ring of encoded span batches in a memory-mapped file, to keep
+    spans the collector did not accept without growing the memory of the
+    worker.
+
+    The file holds a header and a ring of `size` bytes of records - the
+    payload size, its CRC32 and the payload. Records never wrap, the end of
+    the ring is skipped instead. When the ring is full the oldest records
+    are overwritten and counted in `dropped`.
+
+    `head` and `tail` are byte positions which only grow, stored in two
+    header slots with a generation and a checksum, written alternately once
+    the record itself was written. A torn header write leaves the previous
+    slot valid, so a crashed process loses at most its last record and may
+    replay one already sent. Records failing their checksum are discarded.
+    The file is locked, each process needs its own path.
+    """
+
+    def __init__(self, path: str, size: int = 64 << 20) -> None:
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            existing = os.fstat(self._fd).st_size
+            if existing >= _HEADER_SIZE:
+                header = os.pread(self._fd, _HEADER_SIZE, 0)
+                if header[:8] == _MAGIC:
+                    # the size of an existing spool wins
+                    size = _CAPACITY.unpack_from(header, 8)[0]
+            os.ftruncate(self._fd, _HEADER_SIZE + size)
+            self._map = mmap.mmap(self._fd, _HEADER_SIZE + size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._capacity = size
+        self._generation = 0
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        self.corrupted = 0
+        if self._map[:8] == _MAGIC and self._load_header():
+            return
+        self._map[:8] = _MAGIC
+        _CAPACITY.pack_into(self._map, 8, size)
+        self._commit()
+
+    def __len__(self) -> int:
+        """
+        Bytes used in the ring.
+        """
+        return self.tail - self.head
+
+    def append(self, data: bytes) -> bool:
+        """
+        Add a record, overwriting the oldest ones if needed. `False` if the
+        record is larger than the ring.
+        """
+        needed = _RECORD.size + len(data)
+        position = self.tail
+        to_end = self._capacity - position % self._capacity
+        skipped = to_end if to_end < needed else 0
+        if skipped + needed > self._capacity:
+            self.dropped += 1
+            return False
+        while self.tail - self.head + skipped + needed > self._capacity:
+            self.head = self._record_end(self.head)
+            self.dropped += 1
+        if skipped:
+            if skipped >= _RECORD.size:
+                self._pack_record(position, _PADDING, 0)
+            position += skipped
+        offset = _HEADER_SIZE + position % self._capacity
+        self._pack_record(position, len(data), zlib.crc32(data))
+        self._map[offset + _RECORD.size : offset + needed] = data
+        self.tail = position + needed
+        self._commit()
+        return True
+
+    def peek(self) -> Optional[bytes]:
+        """
+        Oldest record, kept until `pop`.
+        """
+        while self.head < self.tail:
+            start = self._record_start(self.head)
+            if start >= self.tail:  # only the skipped end of the ring is left
+                self.head = self.tail
+                self._commit()
+                break
+            offset = _HEADER_SIZE + start % self._capacity
+            size, checksum = _RECORD.unpack_from(self._map, offset)
+            data = self._map[offset + _RECORD.size : offset + _RECORD.size + size]
+            if (
+                start + _RECORD.size + size <= self.tail
+                and zlib.crc32(data) == checksum
+            ):
+                return data
+            # overwritten under an outdated head, or garbage - drop it all
+            self.corrupted += 1
+            self.head = self.tail
+            self._commit()
+        return None
+
+    def pop(self) -> None:
+        """
+        Remove the oldest record, once it was sent.
+        """
+        if self.head < self.tail:
+            self.head = self._record_end(self.head)
+            self._commit()
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        if self._map.closed:
+            return
+        self._map.flush()
+        self._map.close()
+        os.close(self._fd)
+
+    def _record_start(self, position: int) -> int:
+        # skip the end of the ring when no record fits there
+        to_end = self._capacity - position % self._capacity
+        if to_end < _RECORD.size:
+            return position + to_end
+        size, _ = _RECORD.unpack_from(
+            self._map, _HEADER_SIZE + position % self._capacity
+        )
+        if size == _PADDING:
+            return position + to_end
+        return position
+
+    def _record_end(self, position: int) -> int:
+        start = self._record_start(position)
+        size, _ = _RECORD.unpack_from(self._map, _HEADER_SIZE + start % self._capacity)
+        if start >= self.tail or start + _RECORD.size + size > self.tail:
+            return self.tail  # inconsistent, nothing after it can be trusted
+        return start + _RECORD.size + size
+
+    def _pack_record(self, position: int, size: int, checksum: int) -> None:
+        _RECORD.pack_into(
+            self._map, _HEADER_SIZE + position % self._capacity, size, checksum
+        )
+
+    def _read_slot(self, offset: int) -> Optional[Tuple[int, int, int]]:
+        generation, head, tail, checksum = _SLOT.unpack_from(self._map, offset)
+        data = self._map[offset : offset + _SLOT.size - 4]
+        if zlib.crc32(data) != checksum or not 0 <= tail - head <= self._capacity:
+            return None
+        return generation, head, tail
+
+    def _load_header(self) -> bool:
+        slots = [self._read_slot(offset) for offset in _SLOT_OFFSETS]
+        valid = [slot for slot in slots if slot is not None]
+        if not valid:
+            return False
+        self._generation, self.head, self.tail = max(valid)
+        return True
+
+    def _commit(self) -> None:
+        self._generation += 1
+        offset = _SLOT_OFFSETS[self._generation % 2]
+        data = struct.pack("<QQQ", self._generation, self.head, self.tail)
+        self._map[offset : offset + _SLOT.size] = data + struct.pack(
+            "<I", zlib.crc32(data)
+        )
@@ -0,0 +1,146 @@
+import time
+from collections import OrderedDict
+from random import Random
+from typing import Dict, List, Optional, Tuple
+
+from aiozipkin.record import Record
+from aiozipkin.transport import TransportABC
+
+
+class TailSampler(TransportABC):
+    """
+    In-process tail-based sampling, wraps the transport of the tracer.
+
+    Spans are held in memory by trace id until the middleware finishes the
+    request and calls `decide`. The trace is exported when the request took
+    at least `latency_threshold` seconds, failed with an exception, responded
+    with a status code of at least `error_status`, or any of its spans has the
+    `error` tag. Other traces are exported with the `baseline_rate`
+    probability and dropped otherwise.
+
+    At most `max_traces` undecided traces of up to `max_spans_per_trace`
+    spans each are buffered, traces undecided for `ttl` seconds are evicted.
+    Decisions are remembered for the `max_traces` latest traces, so that
+    spans finishing after the request are routed the same way.
+
+    Only sampled spans are recorded, the head sampler should sample every
+    (or most) requests for the tail sampler to have something to choose from.
+    """
+
+    def __init__(
+        self,
+        transport: TransportABC,
+        *,
+        latency_threshold: float = 1.0,
+        error_status: int = 500,
+        baseline_rate: float = 0.0,
+        max_traces: int = 1000,
+        max_spans_per_trace: int = 256,
+        ttl: float = 60,
+        seed: Optional[int] = None,
+    ) -> None:
+        self._transport = transport
+        self._latency_threshold = latency_threshold
+        self._error_status = error_status
+        self._baseline_rate = baseline_rate
+        self._max_traces = max_traces
+        self._max_spans_per_trace = max_spans_per_trace
+        self._ttl = ttl
+        self._rng = Random(seed)
+        self._clock = time.monotonic
+        self._pending: "OrderedDict[str, Tuple[float, List[Record]]]" = OrderedDict()
+        self._decisions: "OrderedDict[str, bool]" = OrderedDict()
+
+        self.traces_kept = 0
+        self.traces_dropped = 0
+        self.traces_evicted = 0
+        self.spans_dropped = 0
+
+    @property
+    def pending_traces(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = {
+            "traces_kept": self.traces_kept,
+            "traces_dropped": self.traces_dropped,
+            "traces_evicted": self.traces_evicted,
+            "tail_spans_dropped": self.spans_dropped,
+            "pending_traces": self.pending_traces,
+        }
+        if hasattr(self._transport, "stats"):
+            stats.update(self._transport.stats())
+        return stats
+
+    def send(self, record: Record) -> None:
+        trace_id = record.context.trace_id
+        decision = self._decisions.get(trace_id)
+        if decision is not None:
+            if decision:
+                self._transport.send(record)
+            else:
+                self.spans_dropped += 1
+            return
+
+        now = self._clock()
+        self._evict(now)
+        pending = self._pending.get(trace_id)
+        if pending is None:
+            pending = self._pending[trace_id] = (now, [])
+        spans = pending[1]
+        if len(spans) < self._max_spans_per_trace:
+            spans.append(record)
+        else:
+            self.spans_dropped += 1
+
+    def should_keep(
+        self, duration: float, status_code: Optional[int], error: bool
+    ) -> bool:
+        return (
+            error
+            or duration >= self._latency_threshold
+            or (status_code is not None and status_code >= self._error_status)
+            or (self._baseline_rate > 0 and self._rng.random() < self._baseline_rate)
+        )
+
+    def decide(
+        self,
+        trace_id: str,
+        duration: float,
+        status_code: Optional[int] = None,
+        error: bool = False,
+    ) -> bool:
+        """
+        Export or drop the spans buffered for the trace, returns the decision.
+        """
+        _, spans = self._pending.pop(trace_id, (None, []))
+        keep = (
+            self._decisions.get(trace_id, False)  # another request kept it
+            or self.should_keep(duration, status_code, error)
+            or any("error" in span._tags for span in spans)
+        )
+        self._decisions[trace_id] = keep
+        self._decisions.move_to_end(trace_id)
+        while len(self._decisions) > self._max_traces:
+            self._decisions.popitem(last=False)
+
+        if keep:
+            self.traces_kept += 1
+            for span in spans:
+                self._transport.send(span)
+        else:
+            self.traces_dropped += 1
+            self.spans_dropped += len(spans)
+        return keep
+
+    def _evict(self, now: float) -> None:
+        while self._pending:
+            trace_id, (started, spans) = next(iter(self._pending.items()))
+            if len(self._pending) < self._max_traces and started > now - self._ttl:
+                break
+            del self._pending[trace_id]
+            self.traces_evicted += 1
+            self.spans_dropped += len(spans)
+
+    async def close(self) -> None:
+        await self._transport.close()
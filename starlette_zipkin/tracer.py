@@ -0,0 +1,58 @@
+from typing import Any, Optional
+
+import aiozipkin as az
+from aiozipkin.helpers import OptBool, TraceContext
+from aiozipkin.span import NoopSpan, Span, SpanAbc
+
+from .ids import IdGenerator
+from .record import Record
+
+
+class Tracer(az.Tracer):
+    """
+    `aiozipkin.Tracer` recording sampled spans into `Record`, which
+    supports deferred (`LazyTag`) tag values, with ids taken from an
+    `IdGenerator`.
+    """
+
+    def __init__(
+        self, *args: Any, id_generator: Optional[IdGenerator] = None, **kwargs: Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._id_generator = id_generator or IdGenerator()
+        self.spans_created = 0
+        self.spans_sampled = 0
+
+    def to_span(self, context: TraceContext) -> SpanAbc:
+        if not context.sampled:
+            return NoopSpan(self, context, self._ignored_exceptions)
+
+        self.spans_sampled += 1
+        record = Record(context, self._local_endpoint)
+        self._records[context] = record
+        return Span(self, context, record, self._ignored_exceptions)
+
+    def _next_context(
+        self,
+        context: Optional[TraceContext] = None,
+        sampled: OptBool = None,
+        debug: bool = False,
+    ) -> TraceContext:
+        self.spans_created += 1
+        span_id = self._id_generator.span_id()
+        if context is not None:
+            return context._replace(
+                span_id=span_id, parent_id=context.span_id, shared=False
+            )
+
+        trace_id = self._id_generator.trace_id()
+        if sampled is None:
+            sampled = self._sampler.is_sampled(trace_id)
+        return TraceContext(
+            trace_id=trace_id,
+            parent_id=None,
+            span_id=span_id,
+            sampled=sampled,
+            debug=debug,
+            shared=False,
+        )
@@ -0,0 +1,15 @@
+from .bounded import DROP_NEWEST, DROP_OLDEST, BoundedTransport
+from .relay import RelayTransport
+from .udp import UdpTransport
+from .worker import PROCESS, THREAD, WorkerTransport
+
+__all__ = [
+    "BoundedTransport",
+    "WorkerTransport",
+    "RelayTransport",
+    "UdpTransport",
+    "DROP_NEWEST",
+    "DROP_OLDEST",
+    "PROCESS",
+    "THREAD",
+]
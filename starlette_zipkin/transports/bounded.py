@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import struct
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set
+
+import aiohttp
+from aiohttp.client_exceptions import ClientError
+from aiozipkin.record import Record
+from aiozipkin.transport import TransportABC
+from yarl import URL
+
+from ..encoding import ENCODINGS, JSON, get_encoding
+from ..record import SpanRecord
+from ..spool import SpanSpool
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+# spooled batches start with the index of their encoding and their span count
+_SPOOLED = struct.Struct("<BI")
+
+
+class BoundedTransport(TransportABC):
+    """
+    Batching transport with a bounded queue of finished spans.
+
+    Spans are sent in batches of `batch_size`, either when a batch is
+    full or every `flush_interval` seconds. At most `max_in_flight`
+    requests to the collector run concurrently. When the collector is too
+    slow and `queue_size` spans are waiting, spans are dropped according to
+    `drop_policy` - `"drop_oldest"` or `"drop_newest"`. Batches are encoded
+    as `encoding` - `"json"`, `"json+gzip"` or `"proto3"`.
+
+    A batch the collector did not accept is sent up to `send_attempts` times,
+    waiting `retry_backoff` seconds and twice as long after each attempt.
+    Retried batches keep their in-flight slot, so the spans held in memory
+    stay bounded by `queue_size` plus `max_in_flight` batches. Batches are
+    not retried once the transport is closing.
+
+    With a `spool_path`, batches the collector did not accept are written
+    to a `SpanSpool` of `spool_size` bytes instead of being counted as
+    failed, and sent again in the flush loop once the collector is back -
+    including those left by a previous process using the same path.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        *,
+        queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 5,
+        max_in_flight: int = 2,
+        drop_policy: str = DROP_OLDEST,
+        send_timeout: float = 5 * 60,
+        send_attempts: int = 3,
+        retry_backoff: float = 0.5,
+        encoding: str = JSON,
+        spool_path: Optional[str] = None,
+        spool_size: int = 64 << 20,
+    ) -> None:
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy {drop_policy!r}")
+        self._address = URL(address)
+        self._encoding = encoding
+        self._encode, self._headers = get_encoding(encoding)
+        self._encoding_index = list(ENCODINGS).index(encoding)
+        self._queue: Deque[SpanRecord] = deque()
+        self._queue_size = queue_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._drop_policy = drop_policy
+        self._send_timeout = send_timeout
+        self._send_attempts = max(send_attempts, 1)
+        self._retry_backoff = retry_backoff
+        self._closing = False
+
+        self.spans_sent = 0
+        self.spans_dropped = 0
+        self.spans_failed = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+        self.flush_max_seconds = 0.0
+        self.encode_seconds = 0.0
+        self.send_retries = 0
+        self.spans_spooled = 0
+        self.batches_replayed = 0
+
+        self._spool = SpanSpool(spool_path, spool_size) if spool_path else None
+        self._connect()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._senders: Set["asyncio.Future[None]"] = set()
+        self._batch_ready = asyncio.Event()
+        self._flusher = asyncio.ensure_future(self._flush_loop())
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = {
+            "spans_sent": self.spans_sent,
+            "spans_dropped": self.spans_dropped,
+            "spans_failed": self.spans_failed,
+            "queue_depth": self.queue_depth,
+            "flushes": self.flushes,
+            "flush_seconds": self.flush_seconds,
+            "flush_max_seconds": self.flush_max_seconds,
+            "encode_seconds": self.encode_seconds,
+            "send_retries": self.send_retries,
+        }
+        if self._spool is not None:
+            stats.update(
+                spans_spooled=self.spans_spooled,
+                batches_replayed=self.batches_replayed,
+                spool_bytes=len(self._spool),
+                spool_dropped=self._spool.dropped,
+            )
+        return stats
+
+    def send(self, record: Record) -> None:
+        if len(self._queue) >= self._queue_size:
+            self.spans_dropped += 1
+            if self._drop_policy == DROP_NEWEST:
+                return
+            self._queue.popleft()
+        # the compact copy lets the record itself be garbage collected
+        self._queue.append(SpanRecord.from_record(record))
+        if len(self._queue) >= self._batch_size:
+            self._batch_ready.set()
+
+    async def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self._batch_ready.set()
+        await self._flusher
+        await self._flush()
+        if self._senders:
+            await asyncio.gather(*self._senders)
+        await self._disconnect()
+        if self._spool is not None:
+            # replayed by the next process using the spool
+            self._spool.close()
+
+    def _connect(self) -> None:
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self._send_timeout),
+            headers=self._headers,
+        )
+
+    async def _disconnect(self) -> None:
+        await self._session.close()
+
+    async def _flush_loop(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self._flush()
+            if self._spool is not None and len(self._spool):
+                await self._replay(self._spool)
+
+    async def _flush(self) -> None:
+        while self._queue:
+            size = min(self._batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(size)]
+            # waiting for a free slot lets the queue fill up - backpressure
+            # is applied through the drop policy, not through the app
+            await self._in_flight.acquire()
+            sender = asyncio.ensure_future(self._send_batch(batch))
+            self._senders.add(sender)
+            sender.add_done_callback(self._senders.discard)
+
+    async def _send_batch(self, batch: List[SpanRecord]) -> None:
+        start = time.perf_counter()
+        data = b""
+        sent = False
+        try:
+            try:
+                data = self._encode(batch)
+            except Exception as exc:  # the batch is lost, not the transport
+                logger.error("Can not encode spans", exc_info=exc)
+            else:
+                self.encode_seconds += time.perf_counter() - start
+                sent = await self._send_with_retries(data)
+        finally:
+            self._in_flight.release()
+        took = time.perf_counter() - start
+        self.flushes += 1
+        self.flush_seconds += took
+        if took > self.flush_max_seconds:
+            self.flush_max_seconds = took
+        if sent:
+            self.spans_sent += len(batch)
+        elif (
+            data
+            and self._spool is not None
+            and self._spool.append(
+                _SPOOLED.pack(self._encoding_index, len(batch)) + data
+            )
+        ):
+            self.spans_spooled += len(batch)
+        else:
+            self.spans_failed += len(batch)
+
+    async def _send_with_retries(self, data: bytes) -> bool:
+        for attempt in range(self._send_attempts):
+            if attempt:
+                if self._closing:  # shutdown does not wait for the collector
+                    return False
+                await asyncio.sleep(self._retry_backoff * 2 ** (attempt - 1))
+                self.send_retries += 1
+            if await self._send_data(data):
+                return True
+        return False
+
+    async def _replay(self, spool: SpanSpool) -> None:
+        """
+        Send the spooled batches, oldest first, until one fails.
+        """
+        while not self._closing:
+            record = spool.peek()
+            if record is None:
+                return
+            head = spool.head
+            index, spans = _SPOOLED.unpack_from(record)
+            if index != self._encoding_index:
+                # spooled before the encoding was changed
+                spool.pop()
+                self.spans_failed += spans
+                continue
+            async with self._in_flight:
+                sent = await self._send_data(record[_SPOOLED.size :])
+            if not sent:
+                return
+            if spool.head == head:  # not overwritten in the meantime
+                spool.pop()
+            self.spans_sent += spans
+            self.batches_replayed += 1
+
+    async def _send_data(self, data: bytes) -> bool:
+        try:
+            async with self._session.post(self._address, data=data) as resp:
+                if resp.status >= 300:
+                    body = await resp.text()
+                    logger.warning(
+                        "zipkin responded with code: %s and body: %s", resp.status, body
+                    )
+                    return False
+        except (asyncio.TimeoutError, ClientError):
+            return False
+        except Exception as exc:  # that code should never break the application
+            logger.error("Can not send spans to zipkin", exc_info=exc)
+            return False
+        return True
@@ -0,0 +1,68 @@
+import asyncio
+import struct
+from typing import Any, Optional
+
+from ..encoding import JSON, JSON_GZIP, PROTO3
+from .bounded import BoundedTransport
+
+DEFAULT_SOCKET_PATH = "/tmp/starlette-zipkin.sock"
+# every batch is prefixed with its size and the index of its encoding
+FRAME_HEADER = struct.Struct("!IB")
+FRAME_ENCODINGS = (JSON, JSON_GZIP, PROTO3)
+
+
+class RelayTransport(BoundedTransport):
+    """
+    Batching transport writing to the per-host `starlette-zipkin-relay`
+    over a Unix domain socket instead of uploading to the collector, so
+    that all the workers of a host share the connection and the batches of
+    the relay.
+
+    Batches are written without waiting for an acknowledgement, those
+    which can not be written (the relay is not running) are counted as
+    failed and the connection is opened again for the next batch. The
+    relay uploads the batches in their `encoding`, the `address` of the
+    collector is only used by the relay.
+    """
+
+    def __init__(
+        self, address: str, *, socket_path: str = DEFAULT_SOCKET_PATH, **kwargs: Any
+    ) -> None:
+        self._socket_path = socket_path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        super().__init__(address, **kwargs)
+        self._frame_encoding = FRAME_ENCODINGS.index(self._encoding)
+
+    def _connect(self) -> None:
+        self._connection_lock = asyncio.Lock()
+
+    async def _disconnect(self) -> None:
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _connection(self) -> asyncio.StreamWriter:
+        async with self._connection_lock:
+            # the relay never writes, end of file means it closed the connection
+            if self._writer is None or self._reader.at_eof():  # type: ignore
+                await self._disconnect()
+                self._reader, self._writer = await asyncio.open_unix_connection(
+                    self._socket_path
+                )
+            return self._writer
+
+    async def _send_data(self, data: bytes) -> bool:
+        try:
+            writer = await self._connection()
+            writer.write(FRAME_HEADER.pack(len(data), self._frame_encoding) + data)
+            await asyncio.wait_for(writer.drain(), self._send_timeout)
+        except (OSError, asyncio.TimeoutError):
+            # a partially written frame can not be resumed, start over
+            await self._disconnect()
+            return False
+        return True
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import socket
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from yarl import URL
+
+from ..encoding import JSON, encode_json_datagrams
+from ..record import SpanRecord
+from .bounded import BoundedTransport
+
+logger = logging.getLogger(__name__)
+
+
+class UdpTransport(BoundedTransport):
+    """
+    Fire-and-forget transport sending the batches of `BoundedTransport` as
+    UDP datagrams to the collector host, for services which rather lose
+    spans than spend event loop time on HTTP requests.
+
+    Each batch is packed into JSON lists of at most `max_datagram_size`
+    bytes (the default fits an Ethernet MTU) written to a non-blocking
+    socket, nothing is awaited. Spans larger than a datagram are counted in
+    `datagrams_oversize` and dropped, datagrams the socket refused (full
+    buffer, nothing listening) in `datagrams_dropped`. `port` defaults to
+    the port of the collector address. Datagrams are always JSON.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        *,
+        port: Optional[int] = None,
+        max_datagram_size: int = 1472,
+        encoding: str = JSON,
+        **kwargs: Any,
+    ) -> None:
+        if encoding != JSON:
+            raise ValueError(f"Unsupported datagram encoding {encoding!r}")
+        if kwargs.get("spool_path"):
+            raise ValueError("Datagrams are never acknowledged, nothing to spool")
+        url = URL(address)
+        self._target = (url.host, port or url.port)
+        self._max_datagram_size = max_datagram_size
+        self._socket: Optional[socket.socket] = None
+        self._address_info: Optional[Tuple[Any, ...]] = None
+
+        self.datagrams_sent = 0
+        self.datagrams_dropped = 0
+        self.datagrams_oversize = 0
+        super().__init__(address, **kwargs)
+
+    def stats(self) -> Dict[str, float]:
+        stats = super().stats()
+        stats.update(
+            datagrams_sent=self.datagrams_sent,
+            datagrams_dropped=self.datagrams_dropped,
+            datagrams_oversize=self.datagrams_oversize,
+        )
+        return stats
+
+    def _connect(self) -> None:
+        pass  # the socket is opened by the first batch, off the constructor
+
+    async def _open(self) -> None:
+        # resolved once with the resolver of the loop, in the family it returns
+        if self._address_info is None:
+            loop = asyncio.get_running_loop()
+            try:
+                infos = await loop.getaddrinfo(*self._target, type=socket.SOCK_DGRAM)
+            except OSError as exc:  # retried with the next batch
+                logger.warning("Can not resolve %s:%s - %s", *self._target, exc)
+                return
+            self._address_info = infos[0]
+        if self._socket is not None:  # opened by a concurrent batch
+            return
+        family, _, proto, _, sockaddr = self._address_info
+        try:
+            sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+            sock.setblocking(False)
+            sock.connect(sockaddr)
+        except OSError as exc:
+            logger.warning("Can not connect to %s:%s - %s", *self._target, exc)
+            return
+        self._socket = sock
+
+    async def _disconnect(self) -> None:
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    async def _send_batch(self, batch: List[SpanRecord]) -> None:
+        start = time.perf_counter()
+        try:
+            payloads, oversize = encode_json_datagrams(batch, self._max_datagram_size)
+            self.encode_seconds += time.perf_counter() - start
+            self.datagrams_oversize += oversize
+            self.spans_dropped += oversize
+            if self._socket is None:
+                await self._open()
+            for payload, spans in payloads:
+                if self._send_datagram(payload):
+                    self.datagrams_sent += 1
+                    self.spans_sent += spans
+                else:
+                    self.datagrams_dropped += 1
+                    self.spans_failed += spans
+        finally:
+            self._in_flight.release()
+        took = time.perf_counter() - start
+        self.flushes += 1
+        self.flush_seconds += took
+        if took > self.flush_max_seconds:
+            self.flush_max_seconds = took
+
+    def _send_datagram(self, payload: bytes) -> bool:
+        if self._socket is None:
+            return False
+        try:
+            self._socket.send(payload)
+        except OSError:
+            # BlockingIOError when the socket buffer is full,
+            # ConnectionRefusedError when nothing listens on the port
+            return False
+        return True
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, MutableSequence, Union
+
+from aiozipkin.record import Record
+from aiozipkin.transport import TransportABC
+
+from ..encoding import JSON, get_encoding
+from ..record import SpanRecord
+
+logger = logging.getLogger(__name__)
+
+THREAD = "thread"
+PROCESS = "process"
+
+_STOP = None
+_SENT = 0
+_FAILED = 1
+_FLUSHES = 2
+# timings in microseconds, the counters are integers to be shared by processes
+_FLUSH_US = 3
+_FLUSH_MAX_US = 4
+_ENCODE_US = 5
+_COUNTERS = 6
+
+
+def _post(address: str, body: bytes, headers: Dict[str, str], timeout: float) -> bool:
+    request = urllib.request.Request(address, data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            return bool(resp.status < 300)
+    except OSError:  # URLError, HTTPError and timeouts
+        return False
+
+
+def _export(
+    spans: "queue.Queue[Any]",
+    address: str,
+    batch_size: int,
+    flush_interval: float,
+    send_timeout: float,
+    encoding: str,
+    counters: MutableSequence[int],
+) -> None:
+    """
+    Worker loop - collect spans into batches, encode and upload them.
+    """
+    encode, headers = get_encoding(encoding)
+    batch: List[SpanRecord] = []
+    deadline = time.monotonic() + flush_interval
+    stopping = False
+    while not stopping:
+        try:
+            span = spans.get(timeout=max(deadline - time.monotonic(), 0))
+            if span is _STOP:
+                stopping = True
+            else:
+                batch.append(span)
+        except queue.Empty:
+            pass
+        if batch and (
+            stopping or len(batch) >= batch_size or time.monotonic() >= deadline
+        ):
+            start = time.perf_counter()
+            try:
+                body = encode(batch)
+                counters[_ENCODE_US] += int((time.perf_counter() - start) * 1e6)
+                sent = _post(address, body, headers, send_timeout)
+            except Exception as exc:  # the worker must survive any span
+                logger.error("Can not send spans to zipkin", exc_info=exc)
+                sent = False
+            took = int((time.perf_counter() - start) * 1e6)
+            counters[_SENT if sent else _FAILED] += len(batch)
+            counters[_FLUSHES] += 1
+            counters[_FLUSH_US] += took
+            counters[_FLUSH_MAX_US] = max(counters[_FLUSH_MAX_US], took)
+            batch = []
+        if time.monotonic() >= deadline:
+            deadline = time.monotonic() + flush_interval
+
+
+class WorkerTransport(TransportABC):
+    """
+    Transport serializing and uploading spans outside of the event loop.
+
+    The loop only copies each finished record into a `SpanRecord` tuple and
+    puts it into a bounded queue. A dedicated thread (`worker="thread"`) or
+    process (`worker="process"`) batches, encodes and POSTs them. When
+    `queue_size` spans are waiting, new spans are dropped. Batches are
+    encoded as `encoding` - `"json"`, `"json+gzip"` or `"proto3"`.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        *,
+        worker: str = THREAD,
+        queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 5,
+        send_timeout: float = 5 * 60,
+        encoding: str = JSON,
+    ) -> None:
+        get_encoding(encoding)  # fail here rather than in the worker
+        self._address = address
+        self._closing = False
+        self.spans_dropped = 0
+        self._counters: Any  # list or shared memory array
+        self._worker: Union[threading.Thread, multiprocessing.process.BaseProcess]
+        args: tuple
+        if worker == THREAD:
+            self._render = False  # lazy tags are rendered by the thread
+            self._queue: Any = queue.Queue(maxsize=queue_size)
+            self._counters = [0] * _COUNTERS
+            args = (
+                self._queue,
+                address,
+                batch_size,
+                flush_interval,
+                send_timeout,
+                encoding,
+            )
+            self._worker = threading.Thread(
+                target=_export, args=args + (self._counters,), daemon=True
+            )
+        elif worker == PROCESS:
+            context = multiprocessing.get_context("spawn")
+            self._render = True
+            self._queue = context.Queue(maxsize=queue_size)
+            self._counters = context.Array("q", _COUNTERS)
+            args = (
+                self._queue,
+                address,
+                batch_size,
+                flush_interval,
+                send_timeout,
+                encoding,
+            )
+            self._worker = context.Process(
+                target=_export, args=args + (self._counters,), daemon=True
+            )
+        else:
+            raise ValueError(f"Unknown worker {worker!r}")
+        self._worker.start()
+
+    @property
+    def spans_sent(self) -> int:
+        return self._counters[_SENT]
+
+    @property
+    def spans_failed(self) -> int:
+        return self._counters[_FAILED]
+
+    @property
+    def queue_depth(self) -> int:
+        try:
+            return int(self._queue.qsize())
+        except NotImplementedError:  # multiprocessing queues on macOS
+            return 0
+
+    def stats(self) -> Dict[str, float]:
+        counters = list(self._counters)
+        return {
+            "spans_sent": counters[_SENT],
+            "spans_dropped": self.spans_dropped,
+            "spans_failed": counters[_FAILED],
+            "queue_depth": self.queue_depth,
+            "flushes": counters[_FLUSHES],
+            "flush_seconds": counters[_FLUSH_US] / 1e6,
+            "flush_max_seconds": counters[_FLUSH_MAX_US] / 1e6,
+            "encode_seconds": counters[_ENCODE_US] / 1e6,
+        }
+
+    def send(self, record: Record) -> None:
+        try:
+            span = SpanRecord.from_record(record, render=self._render)
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.spans_dropped += 1
+
+    async def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        loop = asyncio.get_event_loop()
+        # blocks until there is room in the queue, keep it off the loop
+        await loop.run_in_executor(None, self._queue.put, _STOP)
+        await loop.run_in_executor(None, self._worker.join)
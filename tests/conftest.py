@@ -1,8 +1,14 @@
+import asyncio
+import json
+import struct
+
 import aiozipkin as az
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from aiozipkin.transport import TransportABC
 from starlette.applications import Starlette
-from starlette.requests import Request
+from starlette.datastructures import Headers
 from starlette.responses import PlainTextResponse, Response
 
 from starlette_zipkin import B3Headers, UberHeaders
@@ -46,6 +52,45 @@ class DummyTransport(TransportABC):
         pass
 
 
+class ClosingTransport(DummyTransport):
+    def __init__(self, close_delay=0.0) -> None:
+        super().__init__()
+        self.close_delay = close_delay
+        self.closed = False
+
+    async def close(self) -> None:
+        await asyncio.sleep(self.close_delay)
+        self.closed = True
+
+
+@pytest.fixture
+def closing_transport():
+    return ClosingTransport
+
+
+@pytest.fixture
+def run_lifespan():
+    async def run(app, while_running=None):
+        messages = asyncio.Queue()
+        sent = []
+
+        async def receive():
+            return await messages.get()
+
+        async def send(message):
+            sent.append(message["type"])
+            if message["type"] == "lifespan.startup.complete":
+                if while_running is not None:
+                    await while_running()
+                await messages.put({"type": "lifespan.shutdown"})
+
+        await messages.put({"type": "lifespan.startup"})
+        await app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send)
+        return sent
+
+    return run
+
+
 @pytest.fixture
 def transport():
     return DummyTransport()
@@ -103,8 +148,116 @@ def dummy_request():
 
 
 @pytest.fixture
-def next_response():
-    async def next(request: Request) -> Response:
-        return Response(request.body, headers=dict(request.headers))
+def next_app():
+    async def next(scope, receive, send) -> None:
+        response = Response(headers=dict(Headers(scope=scope)))
+        await response(scope, receive, send)
 
     return next
+
+
+class DummyResponse:
+    def __init__(self, messages) -> None:
+        self.messages = messages
+        self.status_code = messages[0]["status"]
+        self.headers = Headers(raw=messages[0]["headers"])
+
+
+@pytest.fixture
+def call_asgi():
+    async def call(app, request) -> DummyResponse:
+        messages = []
+        received = []
+        response_complete = asyncio.Event()
+
+        async def receive():
+            if received:
+                # the client disconnects only once the response was sent
+                await response_complete.wait()
+                return {"type": "http.disconnect"}
+            received.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                response_complete.set()
+
+        await app(request.scope, receive, send)
+        return DummyResponse(messages)
+
+    return call
+
+
+class DummyCollector:
+    """Local stand-in for the zipkin collector."""
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.requests = []
+        self.status = 202
+        # returned before `status`, one per request
+        self.statuses = []
+        self.server = None
+
+    async def handler(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        self.requests.append((request.headers.copy(), body))
+        if request.content_type == "application/json":
+            self.batches.append(json.loads(body))
+        status = self.statuses.pop(0) if self.statuses else self.status
+        return web.Response(status=status)
+
+    @property
+    def address(self) -> str:
+        return str(self.server.make_url("/api/v2/spans"))
+
+
+@pytest.fixture
+async def collector():
+    dummy = DummyCollector()
+    app = web.Application()
+    app.router.add_post("/api/v2/spans", dummy.handler)
+    dummy.server = TestServer(app)
+    await dummy.server.start_server()
+    yield dummy
+    await dummy.server.close()
+
+
+def decode_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, offset
+
+
+@pytest.fixture
+def decode_message():
+    def decode(data):
+        """Wire format fields as {field number: [values]}."""
+        fields = {}
+        offset = 0
+        while offset < len(data):
+            key, offset = decode_varint(data, offset)
+            number, wire_type = key >> 3, key & 7
+            if wire_type == 0:
+                value, offset = decode_varint(data, offset)
+            elif wire_type == 1:
+                (value,) = struct.unpack_from("<Q", data, offset)
+                offset += 8
+            elif wire_type == 2:
+                size, offset = decode_varint(data, offset)
+                value = data[offset : offset + size]
+                offset += size
+            else:
+                raise AssertionError(f"unexpected wire type {wire_type}")
+            fields.setdefault(number, []).append(value)
+        return fields
+
+    return decode
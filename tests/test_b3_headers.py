@@ -1,7 +1,10 @@
+import pytest
+from aiozipkin.helpers import TraceContext
 from starlette.testclient import TestClient
 
 from starlette_zipkin import B3Headers as Headers
 from starlette_zipkin import ZipkinConfig, ZipkinMiddleware
+from starlette_zipkin.header_formatters.template import Headers as TemplateHeaders
 
 
 def test_sync(app, tracer, b3_keys):
@@ -64,3 +67,157 @@ def test_async_request_data(app, tracer, b3_keys):
         headers[Headers.TRACE_ID_HEADER] == response2.headers[Headers.TRACE_ID_HEADER]
     )
     assert headers["x-b3-spanid"] == response2.headers["x-b3-parentspanid"]
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ([], None),
+        ([(b"x-b3-traceid", b"t")], None),
+        ([(b"x-b3-spanid", b"s")], None),
+        (
+            [(b"host", b"localhost"), (b"x-b3-traceid", b"t"), (b"x-b3-spanid", b"s")],
+            TraceContext("t", None, "s", None, False, False),
+        ),
+        (
+            [
+                (b"x-b3-traceid", b"t"),
+                (b"x-b3-spanid", b"s"),
+                (b"x-b3-parentspanid", b"p"),
+                (b"x-b3-sampled", b"0"),
+                (b"x-b3-flags", b"0"),
+            ],
+            TraceContext("t", "p", "s", False, False, False),
+        ),
+        (
+            [(b"x-b3-traceid", b"t"), (b"x-b3-spanid", b"s"), (b"x-b3-sampled", b"1")],
+            TraceContext("t", None, "s", True, False, False),
+        ),
+        (
+            [(b"x-b3-traceid", b"t"), (b"x-b3-spanid", b"s"), (b"x-b3-flags", b"1")],
+            TraceContext("t", None, "s", True, True, False),
+        ),
+    ],
+)
+def test_extract_context(raw, expected):
+    assert Headers().extract_context(raw) == expected
+
+
+def test_extract_context_matches_make_context():
+    headers = {
+        "X-B3-TraceId": "6223635aa7bfb6597d72ac7c4680bfed",
+        "X-B3-SpanId": "ac7cb16943218de4",
+        "X-B3-ParentSpanId": "bc7cb16943218de4",
+        "X-B3-Sampled": "1",
+    }
+    raw = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+    assert Headers().extract_context(raw) == Headers().make_context(headers)
+
+
+class CustomHeaders(TemplateHeaders):
+    TRACE_ID_HEADER = "custom-trace-id"
+    KEYS = ["Custom-Trace-Id"]
+
+    def make_headers(self, context, response_headers):
+        return {self.TRACE_ID_HEADER: context.trace_id}
+
+    def make_context(self, headers):
+        return TraceContext(headers[self.TRACE_ID_HEADER], None, "s", True, False, False)
+
+    def get_trace_id(self, headers):
+        return headers.get(self.TRACE_ID_HEADER)
+
+
+def test_extract_context_default():
+    assert CustomHeaders.RAW_KEYS == frozenset([b"custom-trace-id"])
+    formatter = CustomHeaders()
+    assert formatter.extract_context([(b"other", b"o")]) is None
+    context = formatter.extract_context([(b"custom-trace-id", b"t")])
+    assert context.trace_id == "t"
+
+
+T = "463ac35c9f6413ad48485a3953bb6124"
+S = "a2fb4a1d1a96d312"
+P = "0020000000000001"
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (f"{T}-{S}", TraceContext(T, None, S, None, False, False)),
+        (f"{T}-{S}-1", TraceContext(T, None, S, True, False, False)),
+        (f"{T}-{S}-0-{P}", TraceContext(T, P, S, False, False, False)),
+        (f"{T}-{S}-d-{P}", TraceContext(T, P, S, True, True, False)),
+        (f"{S}-{S}", TraceContext(S, None, S, None, False, False)),
+        (f"{S}-{S}-d-{P}", TraceContext(S, P, S, True, True, False)),
+        # sampling decision only
+        ("1", None),
+        ("0", None),
+        (f"{T}-", None),
+        (f"-{S}", None),
+        # invalid ids, sampling state or trailing fields
+        ("a-b-true", None),
+        (f"{T}-{S}-true", None),
+        (f"{T}-{S}-a", None),
+        (f"{T}-{S}-1{P}", None),
+        (f"{T}-{S}1-{P}", None),
+        (f"{T}-{S}-", None),
+        (f"{T}-{S}-1-", None),
+        (f"{T}-{S}-1-{P}-extra", None),
+        (f"{T.upper()}-{S}", None),
+        (f"{T[:20]}-{S}", None),
+        (f"{T}-{T}", None),
+        (f"{T}-{S}-1-{T}", None),
+        (f"{T}-zzzzzzzzzzzzzzzz", None),
+    ],
+)
+def test_extract_single_header(value, expected):
+    raw = [(b"host", b"h"), (b"b3", value.encode())]
+    assert Headers().extract_context(raw) == expected
+    assert Headers().make_context({"b3": value}) == expected
+
+
+def test_single_header_takes_precedence():
+    single = f"{S}-{S}-1".encode()
+    raw = [(b"x-b3-traceid", b"t"), (b"x-b3-spanid", b"s"), (b"b3", single)]
+    assert Headers().extract_context(raw).trace_id == S
+    # falls back to the multi-header form
+    raw[2] = (b"b3", b"1")
+    assert Headers().extract_context(raw).trace_id == "t"
+
+
+@pytest.mark.parametrize(
+    "context, expected",
+    [
+        (TraceContext(T, None, S, None, False, False), f"{T}-{S}"),
+        (TraceContext(T, P, S, None, False, False), f"{T}-{S}"),
+        (TraceContext(T, None, S, True, False, False), f"{T}-{S}-1"),
+        (TraceContext(T, P, S, False, False, False), f"{T}-{S}-0-{P}"),
+        (TraceContext(T, P, S, True, True, False), f"{T}-{S}-d-{P}"),
+    ],
+)
+def test_make_single_header(context, expected):
+    formatter = Headers(single_header=True)
+    headers = formatter.make_headers(context, {})
+    assert headers == {"b3": expected}
+    assert formatter.make_context(headers) == context._replace(
+        parent_id=context.parent_id if context.sampled is not None else None
+    )
+    assert formatter.get_trace_id(headers) == T
+
+
+def test_single_header_response(app, tracer):
+    config = ZipkinConfig(
+        header_formatter=Headers, header_formatter_kwargs={"single_header": True}
+    )
+    app.add_middleware(ZipkinMiddleware, config=config, _tracer=tracer)
+    client = TestClient(app)
+    response = client.get("/sync-message")
+    assert "x-b3-traceid" not in response.headers
+    trace_id, span_id, sampled = response.headers["b3"].split("-")
+    assert sampled == "1"
+
+    response2 = client.get("/sync-message", headers={"b3": response.headers["b3"]})
+    trace_id2, span_id2, sampled2, parent_id2 = response2.headers["b3"].split("-")
+    assert trace_id2 == trace_id
+    assert parent_id2 == span_id
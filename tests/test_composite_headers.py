@@ -0,0 +1,109 @@
+import pytest
+from aiozipkin.helpers import TraceContext
+from starlette.responses import Response
+
+from starlette_zipkin import (
+    B3Headers,
+    CompositeHeaders,
+    UberHeaders,
+    W3CHeaders,
+    ZipkinConfig,
+    ZipkinMiddleware,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+B3 = {"X-B3-TraceId": TRACE_ID, "X-B3-SpanId": SPAN_ID, "X-B3-Sampled": "1"}
+UBER = {"uber-trace-id": f"{TRACE_ID}%3A{SPAN_ID}%3A0%3A1"}
+W3C = {"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-01"}
+
+
+def raw(headers):
+    return [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+
+
+@pytest.fixture
+def composite():
+    return CompositeHeaders(formatters=[W3CHeaders, B3Headers, UberHeaders()])
+
+
+def test_keys(composite):
+    assert composite.RAW_KEYS == (
+        W3CHeaders.RAW_KEYS | B3Headers.RAW_KEYS | UberHeaders.RAW_KEYS
+    )
+    assert "traceparent" in composite.KEYS
+    assert "uber-trace-id" in composite.KEYS
+
+
+@pytest.mark.parametrize("headers", [B3, UBER, W3C])
+def test_extract_context(composite, headers):
+    context = composite.extract_context([(b"host", b"localhost")] + raw(headers))
+    assert context == TraceContext(
+        TRACE_ID, None, SPAN_ID, True, False, False
+    )._replace(parent_id="0" if headers is UBER else None)
+
+
+def test_extract_context_order(composite):
+    w3c = {"traceparent": f"00-{'1' * 32}-{SPAN_ID}-01"}
+    context = composite.extract_context(raw(B3) + raw(w3c))
+    assert context.trace_id == "1" * 32
+    # invalid headers of a format fall back to the next one
+    w3c = {"traceparent": "invalid"}
+    context = composite.extract_context(raw(w3c) + raw(B3))
+    assert context.trace_id == TRACE_ID
+    assert composite.extract_context(raw(w3c)) is None
+    assert composite.extract_context([]) is None
+
+
+def test_make_context(composite):
+    assert composite.make_context(UBER).span_id == SPAN_ID
+    assert composite.make_context({}) is None
+    assert composite.get_trace_id(W3C) == TRACE_ID
+    assert composite.get_trace_id({}) is None
+
+
+@pytest.fixture
+def respond():
+    async def respond(formatter, request_headers, call_asgi, tracer, dummy_request):
+        config = ZipkinConfig(header_formatter=lambda: formatter)
+        middleware = ZipkinMiddleware(Response(), config=config, _tracer=tracer)
+        return await call_asgi(middleware, dummy_request(headers=request_headers))
+
+    return respond
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "request_headers, expected",
+    [
+        (B3, "x-b3-traceid"),
+        (UBER, "uber-trace-id"),
+        (W3C, "traceparent"),
+        # new traces use the first formatter
+        ({}, "traceparent"),
+    ],
+)
+async def test_same_format_back(
+    composite, respond, call_asgi, tracer, dummy_request, request_headers, expected
+):
+    resp = await respond(composite, request_headers, call_asgi, tracer, dummy_request)
+    keys = {"x-b3-traceid", "uber-trace-id", "traceparent"}
+    assert {key for key in keys if key in resp.headers} == {expected}
+    if request_headers:
+        assert TRACE_ID in resp.headers[expected]
+
+
+@pytest.mark.asyncio
+async def test_inject(respond, call_asgi, tracer, dummy_request):
+    composite = CompositeHeaders(
+        formatters=[B3Headers, UberHeaders], inject=[W3CHeaders, B3Headers]
+    )
+    resp = await respond(composite, UBER, call_asgi, tracer, dummy_request)
+    assert TRACE_ID in resp.headers["traceparent"]
+    assert resp.headers["x-b3-traceid"] == TRACE_ID
+    assert "uber-trace-id" not in resp.headers
+    headers = composite.make_headers(
+        TraceContext(TRACE_ID, None, SPAN_ID, True, False, False), {}
+    )
+    assert set(headers) >= {"traceparent", "X-B3-TraceId"}
@@ -0,0 +1,125 @@
+import gzip
+import json
+
+import aiozipkin as az
+import pytest
+
+from starlette_zipkin import (
+    BoundedTransport,
+    WorkerTransport,
+    ZipkinConfig,
+    ZipkinMiddleware,
+)
+from starlette_zipkin.encoding import (
+    JSON,
+    JSON_GZIP,
+    PROTO3,
+    encode_json,
+    encode_json_gzip,
+    encode_proto3,
+)
+from starlette_zipkin.record import SpanRecord
+from starlette_zipkin.tracer import Tracer
+
+
+def make_spans(transport):
+    endpoint = az.create_endpoint("dummy-service", ipv4="10.0.0.1", port=8000)
+    tracer = Tracer(transport, az.Sampler(sample_rate=1.0), endpoint)
+    spans = []
+    with tracer.new_trace() as root:
+        root.name("GET /")
+        root.kind(az.SERVER)
+        root.tag("http.status_code", 200)
+        root.tag("http.headers", json.dumps({"cookie": "x" * 100}))
+        root.tag("note", "é")
+        root.annotate("started", 1600000000.0)
+        with tracer.new_child(root.context) as child:
+            child.name("query")
+    for span in (child, root):
+        spans.append(SpanRecord.from_record(span._record))
+    return spans
+
+
+def test_proto3(transport, decode_message):
+    spans = make_spans(transport)
+    message = decode_message(encode_proto3(spans))
+    assert list(message) == [1]
+    child, root = [decode_message(span) for span in message[1]]
+
+    assert root[1] == [bytes.fromhex(spans[1].trace_id)]
+    assert 2 not in root  # no parent
+    assert root[3] == [bytes.fromhex(spans[1].span_id)]
+    assert root[4] == [2]  # SERVER
+    assert root[5] == [b"GET /"]
+    assert root[6] == [spans[1].timestamp]
+    assert root[7] == [spans[1].duration]
+    endpoint = decode_message(root[8][0])
+    assert endpoint == {1: [b"dummy-service"], 2: [bytes([10, 0, 0, 1])], 4: [8000]}
+    annotation = decode_message(root[10][0])
+    assert annotation == {1: [1600000000000000], 2: [b"started"]}
+    tags = [decode_message(entry) for entry in root[11]]
+    tags = {entry[1][0].decode(): entry[2][0].decode() for entry in tags}
+    assert tags == spans[1].tags
+
+    assert child[2] == [bytes.fromhex(spans[1].span_id)]
+    assert 4 not in child  # no kind
+    assert child[5] == [b"query"]
+
+
+def test_json_gzip(transport):
+    spans = make_spans(transport)
+    compressed = encode_json_gzip(spans)
+    assert gzip.decompress(compressed) == encode_json(spans)
+    assert len(compressed) < len(encode_json(spans))
+
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError):
+        ZipkinConfig(encoding="thrift")
+    with pytest.raises(ValueError):
+        BoundedTransport("http://localhost:9411/api/v2/spans", encoding="thrift")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "encoding, content_type",
+    [
+        (JSON, "application/json"),
+        (JSON_GZIP, "application/json"),
+        (PROTO3, "application/x-protobuf"),
+    ],
+)
+@pytest.mark.parametrize("transport_class", [BoundedTransport, WorkerTransport])
+async def test_transport_encoding(
+    collector, transport_class, encoding, content_type, decode_message
+):
+    transport = transport_class(collector.address, encoding=encoding)
+    tracer = Tracer(transport, az.Sampler(sample_rate=1.0), az.create_endpoint("s"))
+    with tracer.new_trace() as span:
+        span.name("span")
+    await transport.close()
+
+    [(headers, body)] = collector.requests
+    assert headers["Content-Type"] == content_type
+    if encoding == PROTO3:
+        [encoded] = decode_message(body)[1]
+        assert decode_message(encoded)[3] == [bytes.fromhex(span.context.span_id)]
+    else:
+        assert headers.get("Content-Encoding") == (
+            "gzip" if encoding == JSON_GZIP else None
+        )
+        assert collector.batches[0][0]["id"] == span.context.span_id
+
+
+@pytest.mark.asyncio
+async def test_config_encoding(
+    collector, next_app, dummy_request, call_asgi, decode_message
+):
+    host, port = collector.server.host, collector.server.port
+    config = ZipkinConfig(host=host, port=port, encoding=PROTO3)
+    middleware = ZipkinMiddleware(next_app, config=config)
+    await call_asgi(middleware, dummy_request())
+    await middleware.tracer.close()
+    [(headers, body)] = collector.requests
+    assert headers["Content-Type"] == "application/x-protobuf"
+    assert len(decode_message(body)[1]) == 1
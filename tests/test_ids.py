@@ -0,0 +1,98 @@
+import os
+import re
+import threading
+import time
+
+import aiozipkin as az
+import pytest
+
+from starlette_zipkin import IdGenerator, ZipkinConfig, ZipkinMiddleware
+from starlette_zipkin.tracer import Tracer
+
+
+def test_span_ids():
+    generator = IdGenerator(pool_size=8)
+    ids = [generator.span_id() for _ in range(100)]
+    assert all(re.fullmatch("[0-9a-f]{16}", span_id) for span_id in ids)
+    assert len(set(ids)) == 100
+
+
+def test_trace_ids_128bit():
+    generator = IdGenerator(pool_size=8)
+    ids = [generator.trace_id() for _ in range(100)]
+    assert all(re.fullmatch("[0-9a-f]{32}", trace_id) for trace_id in ids)
+    assert len(set(ids)) == 100
+    # the upper 32 bits are the epoch second
+    assert abs(int(ids[-1][:8], 16) - time.time()) < 5
+
+
+def test_trace_ids_64bit():
+    generator = IdGenerator(trace_id_bits=64, pool_size=8)
+    ids = [generator.trace_id() for _ in range(100)]
+    assert all(re.fullmatch("[0-9a-f]{16}", trace_id) for trace_id in ids)
+    assert len(set(ids)) == 100
+
+
+def test_unsupported_size():
+    with pytest.raises(ValueError):
+        IdGenerator(trace_id_bits=96)
+
+
+def test_threads():
+    generator = IdGenerator(pool_size=16)
+    ids = []
+
+    def take():
+        ids.extend(generator.span_id() for _ in range(1000))
+
+    threads = [threading.Thread(target=take) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids)) == 8000
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_fork_discards_pool():
+    generator = IdGenerator()
+    generator.span_id()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        os.write(write, generator.span_id().encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    child_id = os.read(read, 16).decode()
+    os.close(read)
+    os.close(write)
+    assert child_id != generator.span_id()
+
+
+def test_tracer_uses_generator(transport):
+    generator = IdGenerator(trace_id_bits=64)
+    tracer = Tracer(
+        transport,
+        az.Sampler(sample_rate=1.0),
+        az.create_endpoint("dummy-service"),
+        id_generator=generator,
+    )
+    with tracer.new_trace() as span:
+        with tracer.new_child(span.context) as child:
+            pass
+    assert len(span.context.trace_id) == 16
+    assert child.context.trace_id == span.context.trace_id
+    assert child.context.parent_id == span.context.span_id
+    assert child.context.span_id != span.context.span_id
+
+
+@pytest.mark.asyncio
+async def test_config(transport, next_app, dummy_request, call_asgi):
+    config = ZipkinConfig(
+        transport=lambda address: transport,
+        id_generator_kwargs={"trace_id_bits": 64},
+    )
+    middleware = ZipkinMiddleware(next_app, config=config)
+    resp = await call_asgi(middleware, dummy_request())
+    assert middleware.tracer._id_generator is config.id_generator
+    assert len(resp.headers["x-b3-traceid"]) == 16
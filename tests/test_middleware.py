@@ -1,46 +1,63 @@
+import asyncio
+
+import aiozipkin as az
 import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
 
-from starlette_zipkin import ZipkinConfig, ZipkinMiddleware, middleware
+from starlette_zipkin import (
+    RateLimitingSampler,
+    ZipkinConfig,
+    ZipkinMiddleware,
+    middleware,
+    trace,
+)
 
 
 @pytest.mark.asyncio
-async def test_dispatch_trace_new_child(app, dummy_request, next_response):
+async def test_dispatch_trace_new_child(dummy_request, next_app, call_asgi):
     trace_id = "6223635aa7bfb6597d72ac7c4680bfed"
     span_id = "ac7cb16943218de4"
     config = ZipkinConfig("zipkin.host")
-    middleware = ZipkinMiddleware(app, config=config)
-    # the tracer is initialized on the first dispatch
+    middleware = ZipkinMiddleware(next_app, config=config)
+    # the tracer is initialized on the first request
     assert middleware.tracer is None
-    resp = await middleware.dispatch(
+    resp = await call_asgi(
+        middleware,
         dummy_request(
             headers={
                 "x-b3-spanid": span_id,
                 "x-b3-traceid": trace_id,
             }
         ),
-        next_response,
     )
     assert middleware.tracer is not None
     assert middleware.tracer._transport is not None
-    assert str(middleware.tracer._transport._address) == "http://zipkin.host:9411/api/v2/spans"
+    assert (
+        str(middleware.tracer._transport._address)
+        == "http://zipkin.host:9411/api/v2/spans"
+    )
     assert resp.headers["x-b3-spanid"] == span_id
     assert resp.headers["x-b3-traceid"] == trace_id
     await middleware.tracer.close()
 
 
 @pytest.mark.asyncio
-async def test_dispatch_trace(app, dummy_request, next_response):
+async def test_dispatch_trace(dummy_request, next_app, call_asgi):
     config = ZipkinConfig()
-    middleware = ZipkinMiddleware(app, config=config)
-    # the tracer is initialized on the first dispatch
+    middleware = ZipkinMiddleware(next_app, config=config)
+    # the tracer is initialized on the first request
     assert middleware.tracer is None
-    resp = await middleware.dispatch(
+    resp = await call_asgi(
+        middleware,
         dummy_request(headers={}),
-        next_response,
     )
     assert middleware.tracer is not None
     assert middleware.tracer._transport is not None
-    assert str(middleware.tracer._transport._address) == "http://localhost:9411/api/v2/spans"
+    assert (
+        str(middleware.tracer._transport._address)
+        == "http://localhost:9411/api/v2/spans"
+    )
     assert resp.headers["x-b3-flags"] == "0"
     assert resp.headers["x-b3-sampled"] == "1"
     assert resp.headers["x-b3-spanid"] == resp.headers["x-b3-spanid"]
@@ -49,20 +66,20 @@ async def test_dispatch_trace(app, dummy_request, next_response):
 
 
 @pytest.mark.asyncio
-async def test_dispatch_trace_buggy_headers(app, dummy_request, next_response):
+async def test_dispatch_trace_buggy_headers(dummy_request, next_app, call_asgi):
     trace_id = "6223635aa7bfb6597d72ac7c4680bfed"
     config = ZipkinConfig()
-    middleware = ZipkinMiddleware(app, config=config)
-    # the tracer is initialized on the first dispatch
+    middleware = ZipkinMiddleware(next_app, config=config)
+    # the tracer is initialized on the first request
     assert middleware.tracer is None
-    resp = await middleware.dispatch(
+    resp = await call_asgi(
+        middleware,
         dummy_request(
             headers={
                 "x-b3-traceid": trace_id,
                 # x-b3-spanid should be here
             }
         ),
-        next_response,
     )
     assert middleware.tracer is not None
     assert middleware.tracer._transport is not None
@@ -76,15 +93,15 @@ async def test_dispatch_trace_buggy_headers(app, dummy_request, next_response):
 
 
 @pytest.mark.asyncio
-async def test_dispatch_trace_reuse_tracer(app, dummy_request, next_response):
+async def test_dispatch_trace_reuse_tracer(dummy_request, next_app, call_asgi):
     config = ZipkinConfig()
-    middleware = ZipkinMiddleware(app, config=config)
-    # the tracer is initialized on the first dispatch
+    middleware = ZipkinMiddleware(next_app, config=config)
+    # the tracer is initialized on the first request
     assert middleware.tracer is None
-    await middleware.dispatch(dummy_request(), next_response)
+    await call_asgi(middleware, dummy_request())
     assert middleware.tracer is not None
     tracer = middleware.tracer
-    await middleware.dispatch(dummy_request(), next_response)
+    await call_asgi(middleware, dummy_request())
     assert middleware.tracer is tracer, "Tracer must be reused on every requests"
     await tracer.close()
 
@@ -167,5 +184,240 @@ def test_get_ip_with_hostname_that_resolves(monkeypatch):
 
 
 def test_get_ip_without_hostname_that_resolves(monkeypatch):
-    monkeypatch.setattr(middleware.socket, "gethostname", lambda: "thishostnamewontresolve")
+    monkeypatch.setattr(
+        middleware.socket, "gethostname", lambda: "thishostnamewontresolve"
+    )
     assert middleware.get_ip() == "0.0.0.0"
+
+
+@pytest.mark.asyncio
+async def test_non_http_scope_passthrough(next_app):
+    called = []
+
+    async def app(scope, receive, send):
+        called.append(scope["type"])
+
+    middleware = ZipkinMiddleware(app, config=ZipkinConfig())
+    await middleware({"type": "lifespan"}, None, None)
+    assert called == ["lifespan"]
+    # no tracer is created for non-http traffic
+    assert middleware.tracer is None
+
+
+@pytest.mark.asyncio
+async def test_streaming_response(tracer, transport, dummy_request, call_asgi):
+    async def app(scope, receive, send):
+        async def chunks():
+            yield b"a"
+            yield b"b"
+
+        await StreamingResponse(chunks())(scope, receive, send)
+
+    middleware = ZipkinMiddleware(app, config=ZipkinConfig(), _tracer=tracer)
+    resp = await call_asgi(middleware, dummy_request())
+    body = b"".join(m.get("body", b"") for m in resp.messages[1:])
+    assert body == b"ab"
+    assert "x-b3-traceid" in resp.headers
+    # span is finished only once the whole body was sent
+    assert len(transport.records) == 1
+    assert transport.records[0]["tags"]["http.status_code"] == "200"
+
+
+@pytest.mark.asyncio
+async def test_error_is_tagged(tracer, transport, dummy_request, call_asgi):
+    async def app(scope, receive, send):
+        raise KeyError("boom")
+
+    middleware = ZipkinMiddleware(app, config=ZipkinConfig(), _tracer=tracer)
+    with pytest.raises(KeyError):
+        await call_asgi(middleware, dummy_request())
+    tags = transport.records[0]["tags"]
+    assert tags["error.object"] == "KeyError"
+    assert "KeyError: 'boom'" in tags["error.stack"]
+
+
+@pytest.mark.asyncio
+async def test_unsampled_skips_tagging(
+    transport, dummy_request, next_app, call_asgi, monkeypatch
+):
+    endpoint = az.create_endpoint("dummy-service")
+    tracer = az.Tracer(transport, az.Sampler(sample_rate=0.0), endpoint)
+    middleware = ZipkinMiddleware(next_app, config=ZipkinConfig(), _tracer=tracer)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("tags must not be built for unsampled requests")
+
+    monkeypatch.setattr(middleware, "get_url", fail)
+    monkeypatch.setattr(middleware, "get_headers", fail)
+    monkeypatch.setattr(middleware.config, "json_encoder", fail)
+    resp = await call_asgi(middleware, dummy_request(querystring=b"a=b"))
+    assert resp.status_code == 200
+    # the sampling decision is still propagated
+    assert resp.headers["x-b3-sampled"] == "0"
+    assert transport.records == []
+
+
+@pytest.mark.asyncio
+async def test_stats(transport, dummy_request, call_asgi):
+    async def slow_app(scope, receive, send):
+        await asyncio.sleep(0.05)
+        with trace("child"):
+            pass
+        await Response()(scope, receive, send)
+
+    config = ZipkinConfig(
+        transport=lambda address: transport,
+        sampler=RateLimitingSampler,
+        sampler_kwargs={"traces_per_second": 1},
+    )
+    middleware = ZipkinMiddleware(slow_app, config=config)
+    for _ in range(3):
+        await call_asgi(middleware, dummy_request())
+
+    stats = middleware.stats()
+    assert stats["requests"] == 3
+    assert stats["requests_sampled"] == 1
+    assert stats["requests_unsampled"] == 2
+    assert stats["spans_created"] == 6
+    assert stats["spans_sampled"] == 2
+    # the time spent in the app is not overhead
+    assert 0 < stats["overhead_max_seconds"] < 0.05
+    assert stats["overhead_mean_seconds"] == pytest.approx(
+        stats["overhead_seconds"] / 3
+    )
+
+
+@pytest.mark.asyncio
+async def test_stats_callback(tracer, next_app, dummy_request, call_asgi):
+    reported = []
+    config = ZipkinConfig(stats_callback=reported.append, stats_interval=0)
+    middleware = ZipkinMiddleware(next_app, config=config, _tracer=tracer)
+    await call_asgi(middleware, dummy_request())
+    await call_asgi(middleware, dummy_request())
+    assert [stats["requests"] for stats in reported] == [1, 2]
+
+    # never reported more often than every `stats_interval`
+    middleware.config.stats_interval = 60
+    await call_asgi(middleware, dummy_request())
+    assert len(reported) == 2
+
+
+@pytest.mark.asyncio
+async def test_stats_callback_failure(tracer, next_app, dummy_request, call_asgi):
+    def fail(stats):
+        raise RuntimeError("boom")
+
+    config = ZipkinConfig(stats_callback=fail, stats_interval=0)
+    middleware = ZipkinMiddleware(next_app, config=config, _tracer=tracer)
+    resp = await call_asgi(middleware, dummy_request())
+    assert resp.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_lifespan(dummy_request, call_asgi, closing_transport, run_lifespan):
+    transport = closing_transport()
+    config = ZipkinConfig(transport=lambda address: transport)
+    middleware = ZipkinMiddleware(Starlette(), config=config)
+    tracers = []
+
+    async def while_running():
+        tracers.append(middleware.tracer)
+        await call_asgi(middleware, dummy_request())
+        assert not transport.closed
+
+    sent = await run_lifespan(middleware, while_running)
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    # created on startup, before the first request
+    assert tracers[0] is not None
+    assert middleware.tracer is None
+    assert len(transport.records) == 1
+    assert transport.closed
+
+
+@pytest.mark.asyncio
+async def test_lifespan_twice(
+    dummy_request, call_asgi, closing_transport, run_lifespan
+):
+    transports = []
+
+    def make_transport(address):
+        transports.append(closing_transport())
+        return transports[-1]
+
+    config = ZipkinConfig(transport=make_transport)
+    middleware = ZipkinMiddleware(Starlette(), config=config)
+    tracers = []
+
+    async def while_running():
+        tracers.append(middleware.tracer)
+        await call_asgi(middleware, dummy_request())
+
+    # e.g. the same application served again by a test client
+    for _ in range(2):
+        await run_lifespan(middleware, while_running)
+    assert tracers[0] is not tracers[1]
+    assert [len(transport.records) for transport in transports] == [1, 1]
+    assert all(transport.closed for transport in transports)
+
+
+@pytest.mark.asyncio
+async def test_lifespan_injected_tracer(tracer, run_lifespan):
+    middleware = ZipkinMiddleware(Starlette(), _tracer=tracer)
+    await run_lifespan(middleware)
+    assert middleware.tracer is tracer
+
+
+@pytest.mark.asyncio
+async def test_lifespan_shutdown_timeout(closing_transport, run_lifespan):
+    transport = closing_transport(close_delay=60)
+    config = ZipkinConfig(transport=lambda address: transport, shutdown_timeout=0.01)
+    middleware = ZipkinMiddleware(Starlette(), config=config)
+    sent = await asyncio.wait_for(run_lifespan(middleware), 5)
+    assert sent[-1] == "lifespan.shutdown.complete"
+    assert not transport.closed
+
+
+@pytest.mark.asyncio
+async def test_lifespan_startup_failure(
+    dummy_request, call_asgi, closing_transport, run_lifespan
+):
+    transport = closing_transport()
+
+    def make_transport(address):
+        if not calls:
+            calls.append(address)
+            raise OSError("collector unreachable")
+        return transport
+
+    calls = []
+    config = ZipkinConfig(transport=make_transport)
+    middleware = ZipkinMiddleware(Starlette(), config=config)
+
+    async def while_running():
+        assert middleware.tracer is None
+        # retried on the first request
+        resp = await call_asgi(middleware, dummy_request())
+        assert resp.status_code == 404
+        assert middleware.tracer is not None
+
+    sent = await run_lifespan(middleware, while_running)
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert transport.closed
+
+
+@pytest.mark.asyncio
+async def test_single_flight_init(next_app, dummy_request, call_asgi, tracer):
+    middleware = ZipkinMiddleware(next_app, config=ZipkinConfig())
+    calls = []
+
+    async def init_tracer():
+        calls.append(True)
+        await asyncio.sleep(0.01)
+        return tracer
+
+    middleware.init_tracer = init_tracer
+    responses = await asyncio.gather(
+        *(call_asgi(middleware, dummy_request()) for _ in range(10))
+    )
+    assert all(resp.status_code == 200 for resp in responses)
+    assert calls == [True]
@@ -0,0 +1,152 @@
+import json
+import pickle
+import sys
+
+import aiozipkin as az
+import pytest
+from aiozipkin.transport import TransportABC
+
+from starlette_zipkin import ZipkinConfig, ZipkinMiddleware
+from starlette_zipkin.record import LazyTag, Record, SpanRecord
+from starlette_zipkin.tracer import Tracer
+
+
+class RecordTransport(TransportABC):
+    """Keeps the records as they are, serialization happens in the test."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+
+    def send(self, record) -> None:
+        self.records.append(record)
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def lazy_tracer():
+    transport = RecordTransport()
+    endpoint = az.create_endpoint("dummy-service")
+    return Tracer(transport, az.Sampler(sample_rate=1.0), endpoint)
+
+
+def test_lazy_tag_rendered_on_asdict(lazy_tracer):
+    calls = []
+
+    def render(value):
+        calls.append(value)
+        return f"rendered {value}"
+
+    span = lazy_tracer.new_trace()
+    assert isinstance(span._record, Record)
+    with span:
+        span.tag("lazy", LazyTag(render, "value"))
+        span.tag("eager", 200)
+    assert calls == []
+
+    record = lazy_tracer._transport.records[0].asdict()
+    assert record["tags"] == {"lazy": "rendered value", "eager": "200"}
+    # rendered only once, the reference is dropped afterwards
+    lazy_tracer._transport.records[0].asdict()
+    assert calls == ["value"]
+
+
+def test_lazy_tag_with_aiozipkin_record(tracer, transport):
+    with tracer.new_trace() as span:
+        span.tag("lazy", LazyTag(str.upper, "value"))
+    assert transport.records[0]["tags"] == {"lazy": "VALUE"}
+
+
+@pytest.mark.asyncio
+async def test_middleware_defers_tags(lazy_tracer, dummy_request, call_asgi):
+    async def app(scope, receive, send):
+        scope["path"] = "/mounted"  # routing mutates the scope
+        raise ValueError("boom")
+
+    middleware = ZipkinMiddleware(app, config=ZipkinConfig(), _tracer=lazy_tracer)
+    with pytest.raises(ValueError):
+        await call_asgi(middleware, dummy_request(path="/path", headers={"a": "A"}))
+
+    record = lazy_tracer._transport.records[0]
+    for key in ("http.url", "http.headers", "error.stack"):
+        assert isinstance(record._tags[key], LazyTag)
+
+    tags = record.asdict()["tags"]
+    assert tags["http.url"] == "http://localhost:8000/path"
+    assert json.loads(tags["http.headers"]) == {"a": "A"}
+    assert "ValueError: boom" in tags["error.stack"]
+
+
+@pytest.mark.asyncio
+async def test_middleware_defers_response_headers(
+    lazy_tracer, dummy_request, next_app, call_asgi
+):
+    middleware = ZipkinMiddleware(next_app, config=ZipkinConfig(), _tracer=lazy_tracer)
+    await call_asgi(middleware, dummy_request(headers={"a": "A"}))
+
+    record = lazy_tracer._transport.records[0]
+    assert isinstance(record._tags["http.response.headers"], LazyTag)
+    response_headers = json.loads(record.asdict()["tags"]["http.response.headers"])
+    assert response_headers["a"] == "A"
+    assert response_headers["x-b3-traceid"] == record.context.trace_id
+
+
+def test_span_record(tracer):
+    with tracer.new_child(tracer.new_trace().context) as span:
+        span.name("name")
+        span.kind(az.CLIENT)
+        span.tag("tag", 1)
+        span.tag("lazy", LazyTag(str.upper, "value"))
+        span.annotate("annotation")
+        span.remote_endpoint("remote", ipv4="127.0.0.1", port=80)
+
+    compact = SpanRecord.from_record(span._record)
+    assert not hasattr(compact, "__dict__")
+    assert compact.asdict() == span._record.asdict()
+    assert pickle.loads(pickle.dumps(compact)) == compact
+
+
+def test_span_record_lazy_tags(lazy_tracer):
+    with lazy_tracer.new_trace() as span:
+        span.tag("lazy", LazyTag(str.upper, "value"))
+    record = lazy_tracer._transport.records[0]
+
+    compact = SpanRecord.from_record(record)
+    assert isinstance(compact.tag_values[0], LazyTag)
+    assert compact.asdict()["tags"] == {"lazy": "VALUE"}
+    assert SpanRecord.from_record(record, render=True).tag_values == ("VALUE",)
+
+
+def test_span_record_shares_endpoints(tracer):
+    spans = []
+    for _ in range(2):
+        with tracer.new_trace() as span:
+            span.tag("".join(["dynamic", "key"]), "value")
+        spans.append(SpanRecord.from_record(span._record))
+    assert spans[0].local_endpoint is spans[1].local_endpoint
+    assert spans[0].tag_keys is spans[1].tag_keys
+    assert spans[0].tag_keys[0] is sys.intern("dynamickey")
+
+
+def test_lazy_tag_render_error(transport, tracer):
+    def render(value):
+        raise TypeError("cannot unpack non-iterable NoneType object")
+
+    with tracer.new_trace() as span:
+        span.tag("lazy", LazyTag(render, None))
+    assert transport.records[0]["tags"] == {"lazy": "<TypeError>"}
+
+
+@pytest.mark.asyncio
+async def test_middleware_unix_socket_server(
+    lazy_tracer, dummy_request, call_asgi, next_app
+):
+    middleware = ZipkinMiddleware(next_app, config=ZipkinConfig(), _tracer=lazy_tracer)
+    request = dummy_request(path="/path")
+    request.scope["server"] = None  # allowed by ASGI, e.g. on a Unix socket
+    await call_asgi(middleware, request)
+    tags = lazy_tracer._transport.records[0].asdict()["tags"]
+    assert tags["http.url"] == "<TypeError>"
+    assert tags["http.route"] == "/path"
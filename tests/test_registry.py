@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount, Route
+
+from starlette_zipkin import TracerRegistry, ZipkinConfig, ZipkinMiddleware
+from starlette_zipkin.registry import shared_tracers
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    yield
+    shared_tracers._entries.clear()
+
+
+@pytest.mark.asyncio
+async def test_acquire_single_flight(tracer):
+    registry = TracerRegistry()
+    calls = []
+
+    async def factory():
+        calls.append(True)
+        await asyncio.sleep(0.01)
+        return tracer
+
+    tracers = await asyncio.gather(
+        *(registry.acquire(("url", "service"), factory) for _ in range(5))
+    )
+    assert tracers == [tracer] * 5
+    assert calls == [True]
+    assert registry.get("url", "service") is tracer
+    assert registry.get("url", "other") is None
+
+
+@pytest.mark.asyncio
+async def test_release(tracer):
+    registry = TracerRegistry()
+
+    async def factory():
+        return tracer
+
+    await registry.acquire(("url", "service"), factory)
+    await registry.acquire(("url", "service"), factory)
+    await registry.acquire(("url", "service"), factory, reference=False)
+    assert registry.release(("url", "service")) is None
+    assert registry.is_current(("url", "service"), tracer)
+    # the last reference closes the tracer
+    assert registry.release(("url", "service")) is tracer
+    assert not registry.is_current(("url", "service"), tracer)
+    assert len(registry) == 0
+    assert registry.release(("url", "service")) is None
+
+
+@pytest.mark.asyncio
+async def test_acquire_failure(tracer):
+    registry = TracerRegistry()
+
+    async def failing():
+        raise OSError("collector unreachable")
+
+    async def factory():
+        return tracer
+
+    with pytest.raises(OSError):
+        await registry.acquire(("url", "service"), failing)
+    assert len(registry) == 0
+    assert await registry.acquire(("url", "service"), factory) is tracer
+
+
+@pytest.mark.asyncio
+async def test_acquire_settings_conflict(tracer, caplog):
+    registry = TracerRegistry()
+
+    async def factory():
+        return tracer
+
+    key = ("url", "service")
+    await registry.acquire(key, factory, settings={"sample_rate": 1.0, "a": 1})
+    await registry.acquire(key, factory, settings={"sample_rate": 1.0})
+    assert caplog.records == []
+    await registry.acquire(key, factory, settings={"sample_rate": 0.1, "a": 2})
+    [record] = caplog.records
+    assert record.levelname == "WARNING"
+    assert "different a, sample_rate" in record.getMessage()
+
+
+@pytest.mark.asyncio
+async def test_middleware_config_conflict(
+    next_app, dummy_request, call_asgi, caplog, closing_transport
+):
+    transport = closing_transport()
+
+    def make_middleware(**kwargs):
+        config = ZipkinConfig(
+            transport=lambda address: transport, shared_tracer=True, **kwargs
+        )
+        return ZipkinMiddleware(next_app, config=config)
+
+    first = make_middleware(sample_rate=1.0)
+    second = make_middleware(sample_rate=0.0)
+    for middleware in (first, second):
+        await call_asgi(middleware, dummy_request())
+    # the tracer of the first one is used, sampling every request
+    assert second.tracer is first.tracer
+    assert len(transport.records) == 2
+    assert "sample_rate" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_middleware_share_tracer(
+    next_app, dummy_request, call_asgi, closing_transport
+):
+    transports = []
+
+    def make_transport(address):
+        transports.append(closing_transport())
+        return transports[-1]
+
+    def make_middleware(service_name="service"):
+        config = ZipkinConfig(
+            service_name=service_name, transport=make_transport, shared_tracer=True
+        )
+        return ZipkinMiddleware(next_app, config=config)
+
+    first, second, other = make_middleware(), make_middleware(), make_middleware("b")
+    for middleware in (first, second, other):
+        await call_asgi(middleware, dummy_request())
+    assert first.tracer is second.tracer
+    assert other.tracer is not first.tracer
+    assert len(transports) == 2
+    assert len(transports[0].records) == 2
+    assert len(transports[1].records) == 1
+
+
+@pytest.mark.asyncio
+async def test_mounted_apps(dummy_request, call_asgi, closing_transport, run_lifespan):
+    transports = []
+
+    def make_transport(address):
+        transports.append(closing_transport())
+        return transports[-1]
+
+    config = ZipkinConfig(transport=make_transport, shared_tracer=True)
+
+    async def hello(request):
+        return PlainTextResponse("ok")
+
+    # mounted applications do not get the lifespan events
+    inner = ZipkinMiddleware(Starlette(routes=[Route("/", hello)]), config=config)
+    outer = ZipkinMiddleware(Starlette(routes=[Mount("/api", inner)]), config=config)
+
+    async def while_running():
+        resp = await call_asgi(outer, dummy_request(path="/api/"))
+        assert resp.status_code == 200
+        assert inner.tracer is outer.tracer
+
+    await run_lifespan(outer, while_running)
+    assert len(transports) == 1
+    assert len(transports[0].records) == 2
+    assert transports[0].closed
+    assert len(shared_tracers) == 0
+
+
+@pytest.mark.asyncio
+async def test_mounted_apps_restart(
+    dummy_request, call_asgi, closing_transport, run_lifespan
+):
+    transports = []
+
+    def make_transport(address):
+        transports.append(closing_transport())
+        return transports[-1]
+
+    config = ZipkinConfig(transport=make_transport, shared_tracer=True)
+
+    async def hello(request):
+        return PlainTextResponse("ok")
+
+    inner = ZipkinMiddleware(Starlette(routes=[Route("/x", hello)]), config=config)
+    outer = ZipkinMiddleware(Starlette(routes=[Mount("/sub", inner)]), config=config)
+
+    async def while_running():
+        await call_asgi(outer, dummy_request(path="/sub/x"))
+        assert inner.tracer is outer.tracer
+
+    # the tracer closed on the first shutdown is not reused by the mounted app
+    for _ in range(2):
+        await run_lifespan(outer, while_running)
+    assert len(transports) == 2
+    assert [len(transport.records) for transport in transports] == [2, 2]
+    assert all(transport.closed for transport in transports)
+    assert len(shared_tracers) == 0
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import socket
+
+import aiozipkin as az
+import pytest
+
+from starlette_zipkin import RelayTransport
+from starlette_zipkin.encoding import JSON_GZIP, PROTO3
+from starlette_zipkin.relay import SpanRelay, main, merge
+from starlette_zipkin.tracer import Tracer
+from starlette_zipkin.transports.relay import FRAME_HEADER
+
+
+def make_tracer(transport):
+    endpoint = az.create_endpoint("dummy-service")
+    return Tracer(transport, az.Sampler(sample_rate=1.0), endpoint)
+
+
+def finish_spans(tracer, count):
+    ids = []
+    for i in range(count):
+        with tracer.new_trace() as span:
+            span.name(f"span {i}")
+        ids.append(span.context.span_id)
+    return ids
+
+
+@pytest.fixture
+async def relay(collector, tmp_path):
+    relay = SpanRelay(str(tmp_path / "relay.sock"), collector.address)
+    await relay.start()
+    yield relay
+    await relay.close()
+
+
+def test_merge():
+    assert merge([b'[{"id":"1"}]']) == b'[{"id":"1"}]'
+    assert json.loads(merge([b'[{"id":"1"}]', b'[{"id":"2"},{"id":"3"}]'])) == [
+        {"id": "1"},
+        {"id": "2"},
+        {"id": "3"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_relay(collector, relay):
+    # two workers of the host, their batches go out in a single upload
+    workers = [
+        RelayTransport("unused", socket_path=relay._socket_path, flush_interval=60)
+        for _ in range(2)
+    ]
+    span_ids = []
+    for transport in workers:
+        span_ids += finish_spans(make_tracer(transport), 2)
+        await transport.close()
+        assert transport.spans_sent == 2
+    await asyncio.sleep(0.01)  # batches in flight on the socket
+    assert relay.batches_received == 2
+    await relay.close()
+    assert [[span["id"] for span in batch] for batch in collector.batches] == [span_ids]
+    assert relay.stats()["uploads"] == 1
+    assert relay.stats()["uploads_failed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_relay_batch_size(collector, tmp_path):
+    relay = SpanRelay(
+        str(tmp_path / "relay.sock"), collector.address, max_batch_bytes=1
+    )
+    await relay.start()
+    for i in range(3):
+        relay.receive(b'[{"id":"%d"}]' % i)
+    relay.receive(b"[]")
+    relay.receive(b"garbage")
+    await relay.close()
+    assert collector.batches == [[{"id": "0"}], [{"id": "1"}], [{"id": "2"}]]
+    assert relay.batches_received == 5
+    assert relay.batches_invalid == 1
+
+
+@pytest.mark.asyncio
+async def test_relay_pending_limit(collector, tmp_path):
+    relay = SpanRelay(
+        str(tmp_path / "relay.sock"), collector.address, max_pending_bytes=24
+    )
+    await relay.start()
+    for i in range(3):
+        relay.receive(b'[{"id":"%d"}]' % i)
+    await relay.close()
+    assert collector.batches == [[{"id": "1"}, {"id": "2"}]]
+    assert relay.batches_dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_relay_oversize_frame(relay):
+    reader, writer = await asyncio.open_unix_connection(relay._socket_path)
+    writer.write(FRAME_HEADER.pack(1 << 30, 0))
+    # the connection is closed instead of buffering the batch
+    assert await reader.read() == b""
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_relay_not_running(tmp_path):
+    transport = RelayTransport(
+        "unused", socket_path=str(tmp_path / "missing.sock"), flush_interval=60
+    )
+    finish_spans(make_tracer(transport), 2)
+    await transport.close()
+    assert transport.spans_failed == 2
+    assert transport.spans_sent == 0
+
+
+@pytest.mark.asyncio
+async def test_relay_restart(collector, tmp_path):
+    path = str(tmp_path / "relay.sock")
+    transport = RelayTransport("unused", socket_path=path, flush_interval=60)
+    tracer = make_tracer(transport)
+    for _ in range(2):
+        relay = SpanRelay(path, collector.address)
+        await relay.start()
+        finish_spans(tracer, 1)
+        await transport._flush()
+        await asyncio.gather(*transport._senders)
+        await asyncio.sleep(0.01)
+        await relay.close()
+    await transport.close()
+    # reconnected to the new relay
+    assert [len(batch) for batch in collector.batches] == [1, 1]
+    assert transport.spans_sent == 2
+
+
+@pytest.mark.asyncio
+async def test_relay_already_running(collector, relay):
+    second = SpanRelay(relay._socket_path, collector.address)
+    with pytest.raises(RuntimeError):
+        await second.start()
+    await second.close()
+    # the socket of the running relay is kept
+    _, writer = await asyncio.open_unix_connection(relay._socket_path)
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_relay_stale_socket(collector, tmp_path):
+    path = str(tmp_path / "relay.sock")
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(path)
+    stale.close()  # the file is left behind
+    relay = SpanRelay(path, collector.address)
+    await relay.start()
+    _, writer = await asyncio.open_unix_connection(path)
+    writer.close()
+    await relay.close()
+
+
+@pytest.mark.asyncio
+async def test_relay_not_a_socket(collector, tmp_path):
+    path = tmp_path / "important.txt"
+    path.write_text("keep me")
+    relay = SpanRelay(str(path), collector.address)
+    with pytest.raises(RuntimeError):
+        await relay.start()
+    assert path.read_text() == "keep me"
+
+
+@pytest.mark.asyncio
+async def test_relay_close_connected(collector, relay):
+    transport = RelayTransport(
+        "unused", socket_path=relay._socket_path, flush_interval=60
+    )
+    span_ids = finish_spans(make_tracer(transport), 2)
+    await transport._flush()
+    await asyncio.gather(*transport._senders)
+    await asyncio.sleep(0.01)
+    # the worker keeps its connection open while the relay shuts down
+    await asyncio.wait_for(relay.close(), 5)
+    assert relay.stats()["connections"] == 0
+    assert [span["id"] for span in collector.batches[0]] == span_ids
+    await transport.close()
+
+
+def test_main_arguments(monkeypatch):
+    relays = []
+
+    async def serve(relay):
+        relays.append(relay)
+
+    monkeypatch.setattr("starlette_zipkin.relay.serve", serve)
+    main(["--socket", "/tmp/test.sock", "--flush-interval", "0.5"])
+    assert relays[0]._socket_path == "/tmp/test.sock"
+    assert relays[0]._flush_interval == 0.5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding", [JSON_GZIP, PROTO3])
+async def test_relay_encoding(collector, relay, encoding, decode_message):
+    workers = [
+        RelayTransport(
+            "unused",
+            socket_path=relay._socket_path,
+            flush_interval=60,
+            encoding=encoding,
+        )
+        for _ in range(2)
+    ]
+    for transport in workers:
+        finish_spans(make_tracer(transport), 2)
+        await transport.close()
+    await asyncio.sleep(0.01)
+    await relay.close()
+
+    [(headers, body)] = collector.requests
+    if encoding == PROTO3:
+        assert headers["Content-Type"] == "application/x-protobuf"
+        assert len(decode_message(body)[1]) == 4
+    else:
+        assert headers["Content-Encoding"] == "gzip"
+        assert len(collector.batches[0]) == 4
@@ -0,0 +1,150 @@
+import aiozipkin as az
+import pytest
+
+from starlette_zipkin import ZipkinConfig, ZipkinMiddleware
+from starlette_zipkin.rules import EXCLUDED, HeaderRules, PathRules
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/health", EXCLUDED),
+        ("/healthz", EXCLUDED),
+        ("/metrics", None),
+        ("/metrics/", EXCLUDED),
+        ("/static/app.js", EXCLUDED),
+        ("/orders/1", 0.5),
+        ("/orders", None),
+        ("/users", 0.0),
+        ("/users/1", None),
+        ("/api/static/app.js", None),
+    ],
+)
+def test_match(path, expected):
+    rules = PathRules(
+        exclude=["/health", "/metrics/$", r"/static/"],
+        sample_rates={"/orders/": 0.5, "/users$": 0.0},
+    )
+    assert rules.match(path) == expected
+
+
+def test_first_match_wins():
+    rules = PathRules(exclude=["/static/"], sample_rates={"/static/app": 1.0, "/": 0.1})
+    assert rules.match("/static/app.js") == EXCLUDED
+    assert rules.match("/app") == 0.1
+
+
+def test_no_rules():
+    assert PathRules().match("/") is None
+
+
+def test_patterns_with_groups():
+    rules = PathRules(sample_rates={r"/(a|b)/(?:c)": 0.2, "/d": 0.3})
+    assert rules.match("/b/c") == 0.2
+    assert rules.match("/d") == 0.3
+
+
+@pytest.mark.asyncio
+async def test_excluded_path(transport, dummy_request, next_app, call_asgi):
+    config = ZipkinConfig(exclude_paths=["/health"])
+    middleware = ZipkinMiddleware(next_app, config=config)
+    resp = await call_asgi(middleware, dummy_request(path="/health"))
+    assert resp.status_code == 200
+    assert "x-b3-traceid" not in resp.headers
+    # excluded requests do not even initialize the tracer
+    assert middleware.tracer is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("rate, sampled", [(0.0, "0"), (1.0, "1")])
+async def test_route_sample_rate(
+    transport, dummy_request, next_app, call_asgi, rate, sampled
+):
+    endpoint = az.create_endpoint("dummy-service")
+    # the route rate overrides the sampler of the tracer
+    sampler = az.Sampler(sample_rate=1.0 - rate)
+    tracer = az.Tracer(transport, sampler, endpoint)
+    config = ZipkinConfig(route_sample_rates={"/orders": rate})
+    middleware = ZipkinMiddleware(next_app, config=config, _tracer=tracer)
+
+    resp = await call_asgi(middleware, dummy_request(path="/orders"))
+    assert resp.headers["x-b3-sampled"] == sampled
+    resp = await call_asgi(middleware, dummy_request(path="/users"))
+    assert resp.headers["x-b3-sampled"] == ("0" if sampled == "1" else "1")
+
+
+@pytest.mark.asyncio
+async def test_route_sample_rate_keeps_upstream_decision(
+    tracer, transport, dummy_request, next_app, call_asgi
+):
+    config = ZipkinConfig(route_sample_rates={"/orders": 0.0})
+    middleware = ZipkinMiddleware(next_app, config=config, _tracer=tracer)
+    headers = {"x-b3-traceid": "t", "x-b3-spanid": "s", "x-b3-sampled": "1"}
+    await call_asgi(middleware, dummy_request(path="/orders", headers=headers))
+    assert [record["traceId"] for record in transport.records] == ["t"]
+
+
+RAW_HEADERS = [
+    (b"host", b"localhost"),
+    (b"accept", b"text/html"),
+    (b"accept", b"application/json"),
+    (b"cookie", b"session=secret"),
+    (b"Authorization", b"Bearer secret"),
+]
+
+
+@pytest.mark.parametrize(
+    "kwargs, expected",
+    [
+        (
+            {},
+            {
+                "host": "localhost",
+                "accept": "text/html, application/json",
+                "cookie": "[redacted]",
+                "authorization": "[redacted]",
+            },
+        ),
+        ({"allow": ["Host", "cookie"]}, {"host": "localhost", "cookie": "[redacted]"}),
+        (
+            {"deny": ["cookie", "authorization"], "redact": []},
+            {"host": "localhost", "accept": "text/html, application/json"},
+        ),
+        ({"allow": ["host"], "deny": ["host"]}, {}),
+    ],
+)
+def test_header_rules(kwargs, expected):
+    rules = HeaderRules(**kwargs)
+    assert rules.select(RAW_HEADERS) == expected
+    assert rules.enabled == bool(expected)
+
+
+def test_header_rules_truncate():
+    rules = HeaderRules(max_length=10)
+    assert rules.truncate("0123456789") == "0123456789"
+    assert rules.truncate("0123456789abc") == "0123456..."
+    assert HeaderRules().truncate("x" * 10000) == "x" * 10000
+
+
+@pytest.mark.asyncio
+async def test_header_tags(tracer, transport, dummy_request, call_asgi, next_app):
+    config = ZipkinConfig(header_allowlist=["user-agent", "cookie"], max_tag_length=40)
+    middleware = ZipkinMiddleware(next_app, config=config, _tracer=tracer)
+    request = dummy_request(headers={"user-agent": "x" * 100, "cookie": "secret"})
+    await call_asgi(middleware, request)
+    tags = transport.records[0]["tags"]
+    assert tags["http.headers"] == '{"user-agent": "' + "x" * 21 + "..."
+    # next_app echoes the request headers
+    assert "secret" not in tags["http.response.headers"]
+
+
+@pytest.mark.asyncio
+async def test_header_tags_disabled(
+    tracer, transport, dummy_request, call_asgi, next_app
+):
+    config = ZipkinConfig(header_allowlist=[])
+    middleware = ZipkinMiddleware(next_app, config=config, _tracer=tracer)
+    await call_asgi(middleware, dummy_request(headers={"cookie": "secret"}))
+    tags = transport.records[0]["tags"]
+    assert "http.headers" not in tags
+    assert "http.response.headers" not in tags
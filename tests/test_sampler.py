@@ -0,0 +1,183 @@
+from random import Random
+
+import pytest
+
+from starlette_zipkin import (
+    AdaptiveSampler,
+    RateLimitingSampler,
+    ZipkinConfig,
+    ZipkinMiddleware,
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_sampler(**kwargs):
+    clock = Clock()
+    sampler = RateLimitingSampler(**kwargs)
+    sampler._clock = clock
+    sampler._last = clock.now
+    return sampler, clock
+
+
+def make_adaptive_sampler(**kwargs):
+    clock = Clock()
+    sampler = AdaptiveSampler(**kwargs)
+    sampler._clock = clock
+    sampler._window_start = clock.now
+    return sampler, clock
+
+
+_ids = Random(0)
+
+
+def generate_random_128bit_string():
+    # seeded, the sampled counts do not depend on the test run
+    return f"{_ids.getrandbits(128):032x}"
+
+
+def run_adaptive(sampler, clock, requests_per_second, seconds):
+    """Sampled traces per second during the last simulated second."""
+    sampled = 0
+    for _ in range(seconds):
+        clock.now += 1
+        sampled = sum(
+            sampler.is_sampled(generate_random_128bit_string())
+            for _ in range(requests_per_second)
+        )
+    return sampled
+
+
+def count_sampled(sampler, count):
+    return sum(sampler.is_sampled("trace_id") for _ in range(count))
+
+
+def test_rate_limiting():
+    sampler, clock = make_sampler(traces_per_second=10)
+    # the bucket starts full
+    assert count_sampled(sampler, 100) == 10
+    clock.now += 0.5
+    assert count_sampled(sampler, 100) == 5
+    # export volume does not depend on the request rate
+    for _ in range(10):
+        clock.now += 1
+        assert count_sampled(sampler, 1000) == 10
+
+
+def test_burst():
+    sampler, clock = make_sampler(traces_per_second=1, max_burst=5)
+    assert count_sampled(sampler, 10) == 5
+    clock.now += 60
+    assert count_sampled(sampler, 10) == 5
+
+
+def test_fractional_rate():
+    sampler, clock = make_sampler(traces_per_second=0.5)
+    assert count_sampled(sampler, 10) == 1
+    clock.now += 1
+    assert count_sampled(sampler, 10) == 0
+    clock.now += 1
+    assert count_sampled(sampler, 10) == 1
+
+
+def test_floor_rate():
+    sampler, clock = make_sampler(traces_per_second=1, floor_rate=0.1, seed=1)
+    sampled = count_sampled(sampler, 10001)
+    assert 900 < sampled - 1 < 1100
+
+
+def test_config_sampler():
+    config = ZipkinConfig(
+        sampler=RateLimitingSampler, sampler_kwargs={"traces_per_second": 3}
+    )
+    assert isinstance(config.sampler, RateLimitingSampler)
+    assert config.sampler._rate == 3
+
+
+@pytest.mark.asyncio
+async def test_middleware_uses_config_sampler(next_app, dummy_request, call_asgi):
+    config = ZipkinConfig(
+        sampler=RateLimitingSampler, sampler_kwargs={"traces_per_second": 1}
+    )
+    middleware = ZipkinMiddleware(next_app, config=config)
+    first = await call_asgi(middleware, dummy_request())
+    second = await call_asgi(middleware, dummy_request())
+    assert middleware.tracer._sampler is config.sampler
+    assert first.headers["x-b3-sampled"] == "1"
+    assert second.headers["x-b3-sampled"] == "0"
+    await middleware.tracer.close()
+
+
+def test_adaptive_sampler_follows_traffic():
+    sampler, clock = make_adaptive_sampler(traces_per_second=10)
+    assert sampler.rate == 1.0
+    assert 5 < run_adaptive(sampler, clock, 100, 20) < 20
+    assert sampler.rate == pytest.approx(0.1, rel=0.05)
+    # traffic surge
+    assert 5 < run_adaptive(sampler, clock, 1000, 20) < 20
+    assert sampler.rate == pytest.approx(0.01, rel=0.05)
+    # quiet period, everything is sampled
+    run_adaptive(sampler, clock, 5, 20)
+    assert sampler.rate == 1.0
+
+
+def test_adaptive_sampler_smoothing():
+    sampler, clock = make_adaptive_sampler(traces_per_second=10, smoothing=0.5)
+    run_adaptive(sampler, clock, 100, 10)
+    run_adaptive(sampler, clock, 200, 1)
+    clock.now += 1
+    sampler.is_sampled(generate_random_128bit_string())
+    # half way between the previous and the measured request rate
+    assert sampler.rate == pytest.approx(10 / 150, rel=0.05)
+
+
+def test_adaptive_sampler_is_deterministic():
+    sampler, _ = make_adaptive_sampler(traces_per_second=1, initial_rate=0.5)
+    other, _ = make_adaptive_sampler(traces_per_second=1, initial_rate=0.5)
+    assert sampler.is_sampled("ffffffffffffffff" + "7fffffffffffffff")
+    assert not sampler.is_sampled("0000000000000000" + "8000000000000000")
+    trace_ids = [generate_random_128bit_string() for _ in range(1000)]
+    decisions = [sampler.is_sampled(trace_id) for trace_id in trace_ids]
+    assert decisions == [other.is_sampled(trace_id) for trace_id in trace_ids]
+    assert 400 < sum(decisions) < 600
+
+
+@pytest.mark.asyncio
+async def test_middleware_tags_adaptive_rate(
+    transport, next_app, dummy_request, call_asgi
+):
+    config = ZipkinConfig(
+        transport=lambda address: transport,
+        sampler=AdaptiveSampler,
+        sampler_kwargs={"traces_per_second": 10},
+    )
+    middleware = ZipkinMiddleware(next_app, config=config)
+    await call_asgi(middleware, dummy_request())
+    assert transport.records[0]["tags"]["sampler.rate"] == "1.0"
+
+    # joined traces were sampled upstream
+    headers = {
+        "X-B3-TraceId": "463ac35c9f6413ad48485a3953bb6124",
+        "X-B3-SpanId": "a2fb4a1d1a96d312",
+        "X-B3-Sampled": "1",
+    }
+    await call_asgi(middleware, dummy_request(headers=headers))
+    assert "sampler.rate" not in transport.records[1]["tags"]
+
+
+@pytest.mark.asyncio
+async def test_middleware_tags_route_rate(
+    transport, next_app, dummy_request, call_asgi
+):
+    config = ZipkinConfig(
+        transport=lambda address: transport, route_sample_rates={"/": 1.0}
+    )
+    middleware = ZipkinMiddleware(next_app, config=config)
+    await call_asgi(middleware, dummy_request())
+    assert transport.records[0]["tags"]["sampler.rate"] == "1.0"
@@ -0,0 +1,162 @@
+import asyncio
+
+import aiozipkin as az
+import pytest
+
+from starlette_zipkin import BoundedTransport
+from starlette_zipkin.spool import _SLOT_OFFSETS, SpanSpool
+from starlette_zipkin.tracer import Tracer
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "spans.spool")
+
+
+def drain(spool):
+    records = []
+    while True:
+        record = spool.peek()
+        if record is None:
+            return records
+        records.append(record)
+        spool.pop()
+
+
+def test_fifo(path):
+    spool = SpanSpool(path, size=1024)
+    for i in range(3):
+        assert spool.append(b"batch %d" % i)
+    assert spool.peek() == b"batch 0"
+    assert spool.peek() == b"batch 0"  # kept until popped
+    assert drain(spool) == [b"batch 0", b"batch 1", b"batch 2"]
+    assert len(spool) == 0
+    spool.close()
+
+
+def test_wrap_around(path):
+    spool = SpanSpool(path, size=100)
+    # 8 bytes of header per record, the third one does not fit at the end
+    for i in range(10):
+        assert spool.append(bytes([i]) * 30)
+        assert spool.peek() == bytes([i]) * 30
+        spool.pop()
+    assert spool.tail > 100
+    spool.append(b"a" * 30)
+    spool.append(b"b" * 30)
+    assert drain(spool) == [b"a" * 30, b"b" * 30]
+    spool.close()
+
+
+def test_overwrite_oldest(path):
+    spool = SpanSpool(path, size=100)
+    for i in range(5):
+        spool.append(bytes([i]) * 30)
+    assert spool.dropped == 3
+    assert len(spool) <= 100
+    assert drain(spool) == [bytes([3]) * 30, bytes([4]) * 30]
+    assert not spool.append(b"x" * 100)  # larger than the ring
+    spool.close()
+
+
+def test_reopen(path):
+    spool = SpanSpool(path, size=1024)
+    for i in range(3):
+        spool.append(b"batch %d" % i)
+    spool.pop()
+    spool.close()
+
+    # the size of the existing file wins
+    spool = SpanSpool(path, size=4096)
+    assert spool._capacity == 1024
+    assert drain(spool) == [b"batch 1", b"batch 2"]
+    spool.close()
+
+
+def test_torn_header(path):
+    spool = SpanSpool(path, size=1024)
+    spool.append(b"batch 0")
+    spool.append(b"batch 1")
+    # the process died while writing the header of the last record
+    latest = _SLOT_OFFSETS[spool._generation % 2]
+    spool._map[latest + 8] ^= 0xFF
+    spool.close()
+
+    spool = SpanSpool(path, size=1024)
+    assert drain(spool) == [b"batch 0"]
+    spool.close()
+
+
+def test_corrupted_record(path):
+    spool = SpanSpool(path, size=1024)
+    spool.append(b"batch 0")
+    spool._map[128 + 8] ^= 0xFF  # first payload byte
+    assert spool.peek() is None
+    assert spool.corrupted == 1
+    assert len(spool) == 0
+    spool.close()
+
+
+def test_locked(path):
+    spool = SpanSpool(path)
+    with pytest.raises(BlockingIOError):
+        SpanSpool(path)
+    spool.close()
+
+
+def finish_spans(transport, count):
+    tracer = Tracer(transport, az.Sampler(sample_rate=1.0), az.create_endpoint("s"))
+    ids = []
+    for i in range(count):
+        with tracer.new_trace() as span:
+            span.name(f"span {i}")
+        ids.append(span.context.span_id)
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_transport_spool(collector, path):
+    collector.status = 500
+    transport = BoundedTransport(
+        collector.address,
+        batch_size=2,
+        flush_interval=60,
+        send_attempts=1,
+        spool_path=path,
+    )
+    span_ids = finish_spans(transport, 3)
+    await transport._flush()
+    await asyncio.gather(*transport._senders)
+    assert transport.spans_spooled == 3
+    assert transport.spans_failed == 0
+
+    # the collector recovered
+    collector.status = 202
+    await transport._replay(transport._spool)
+    assert transport.batches_replayed == 2
+    assert transport.stats()["spool_bytes"] == 0
+    await transport.close()
+    assert transport.spans_sent == 3
+    sent = [span["id"] for batch in collector.batches for span in batch]
+    assert sent[-3:] == span_ids
+
+
+@pytest.mark.asyncio
+async def test_transport_spool_next_process(collector, path):
+    collector.status = 500
+    transport = BoundedTransport(collector.address, flush_interval=60, spool_path=path)
+    span_ids = finish_spans(transport, 2)
+    await transport.close()
+    assert transport.spans_spooled == 2
+
+    collector.status = 202
+    collector.batches.clear()
+    transport = BoundedTransport(
+        collector.address, flush_interval=0.01, spool_path=path
+    )
+    for _ in range(100):
+        if transport.batches_replayed:
+            break
+        await asyncio.sleep(0.01)
+    await transport.close()
+    assert [span["id"] for span in collector.batches[0]] == span_ids
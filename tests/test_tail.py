@@ -0,0 +1,223 @@
+import aiozipkin as az
+import pytest
+from starlette.responses import Response
+
+from starlette_zipkin import TailSampler, ZipkinConfig, ZipkinMiddleware, trace
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_sampler(transport, **kwargs):
+    clock = Clock()
+    sampler = TailSampler(transport, **kwargs)
+    sampler._clock = clock
+    return sampler, clock
+
+
+def make_tracer(sampler):
+    endpoint = az.create_endpoint("dummy-service")
+    return az.Tracer(sampler, az.Sampler(sample_rate=1.0), endpoint)
+
+
+def finish_span(tracer, trace_id=None, error=False):
+    if trace_id is None:
+        span = tracer.new_trace(sampled=True)
+    else:
+        context = tracer._next_context(None)._replace(trace_id=trace_id)
+        span = tracer.new_child(context)
+    span.start()
+    if error:
+        span.tag("error", "true")
+    span.finish()
+    return span.context.trace_id
+
+
+@pytest.fixture
+def tail_tracer(transport):
+    sampler, clock = make_sampler(transport, latency_threshold=0.5)
+    return make_tracer(sampler), sampler, clock
+
+
+def test_buffers_until_decided(tail_tracer, transport):
+    tracer, sampler, _ = tail_tracer
+    trace_id = finish_span(tracer)
+    finish_span(tracer, trace_id)
+    assert transport.records == []
+    assert sampler.pending_traces == 1
+
+    assert sampler.decide(trace_id, 1.0)
+    assert len(transport.records) == 2
+    assert sampler.pending_traces == 0
+    assert sampler.traces_kept == 1
+
+
+@pytest.mark.parametrize(
+    "duration, status_code, error, kept",
+    [
+        (0.1, 200, False, False),
+        (0.1, None, False, False),
+        (0.5, 200, False, True),
+        (0.1, 500, False, True),
+        (0.1, 404, False, False),
+        (0.1, None, True, True),
+    ],
+)
+def test_decision(tail_tracer, transport, duration, status_code, error, kept):
+    tracer, sampler, _ = tail_tracer
+    trace_id = finish_span(tracer)
+    assert sampler.decide(trace_id, duration, status_code, error) is kept
+    assert len(transport.records) == (1 if kept else 0)
+    assert sampler.spans_dropped == (0 if kept else 1)
+
+
+def test_error_tag_keeps_trace(tail_tracer, transport):
+    tracer, sampler, _ = tail_tracer
+    trace_id = finish_span(tracer)
+    finish_span(tracer, trace_id, error=True)
+    assert sampler.decide(trace_id, 0.1, 200)
+    assert len(transport.records) == 2
+
+
+def test_baseline_rate(transport):
+    sampler, _ = make_sampler(transport, baseline_rate=0.1, seed=1)
+    kept = sum(sampler.decide(str(i), 0.0, 200) for i in range(10000))
+    assert 900 < kept < 1100
+
+
+def test_late_spans_follow_decision(tail_tracer, transport):
+    tracer, sampler, _ = tail_tracer
+    kept = finish_span(tracer)
+    dropped = finish_span(tracer)
+    sampler.decide(kept, 1.0)
+    sampler.decide(dropped, 0.1)
+
+    finish_span(tracer, kept)
+    finish_span(tracer, dropped)
+    assert len(transport.records) == 2
+    assert {r["traceId"] for r in transport.records} == {kept}
+    assert sampler.pending_traces == 0
+
+
+def test_max_spans_per_trace(transport):
+    sampler, _ = make_sampler(transport, max_spans_per_trace=3)
+    tracer = make_tracer(sampler)
+    trace_id = finish_span(tracer)
+    for _ in range(4):
+        finish_span(tracer, trace_id)
+    assert sampler.spans_dropped == 2
+    sampler.decide(trace_id, 10)
+    assert len(transport.records) == 3
+
+
+def test_max_traces(transport):
+    sampler, _ = make_sampler(transport, max_traces=3)
+    tracer = make_tracer(sampler)
+    trace_ids = [finish_span(tracer) for _ in range(5)]
+    assert sampler.pending_traces == 3
+    assert sampler.traces_evicted == 2
+    # the oldest traces were evicted
+    sampler.decide(trace_ids[0], 10)
+    assert transport.records == []
+    sampler.decide(trace_ids[4], 10)
+    assert len(transport.records) == 1
+
+
+def test_ttl(transport):
+    sampler, clock = make_sampler(transport, ttl=10)
+    tracer = make_tracer(sampler)
+    stale = finish_span(tracer)
+    clock.now += 5
+    fresh = finish_span(tracer)
+    clock.now += 6
+    finish_span(tracer)
+    assert sampler.traces_evicted == 1
+    assert sampler.pending_traces == 2
+    sampler.decide(stale, 10)
+    sampler.decide(fresh, 10)
+    assert [r["traceId"] for r in transport.records] == [fresh]
+
+
+def test_decisions_are_bounded(transport):
+    sampler, _ = make_sampler(transport, max_traces=2)
+    for i in range(5):
+        sampler.decide(str(i), 10)
+    assert list(sampler._decisions) == ["3", "4"]
+
+
+@pytest.mark.asyncio
+async def test_close(transport):
+    closed = []
+
+    async def close():
+        closed.append(True)
+
+    transport.close = close
+    sampler = TailSampler(transport)
+    await sampler.close()
+    assert closed == [True]
+
+
+@pytest.fixture
+def failing_app():
+    async def app(scope, receive, send) -> None:
+        with trace("child"):
+            pass
+        if scope["path"] == "/raise":
+            raise RuntimeError("boom")
+        status_code = {"/fail": 500, "/missing": 404}.get(scope["path"], 200)
+        await Response(status_code=status_code)(scope, receive, send)
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_middleware(transport, failing_app, dummy_request, call_asgi):
+    config = ZipkinConfig(
+        transport=lambda address: transport,
+        tail_sampler=TailSampler,
+        tail_sampler_kwargs={"latency_threshold": 10},
+    )
+    middleware = ZipkinMiddleware(failing_app, config=config)
+
+    await call_asgi(middleware, dummy_request(path="/ok"))
+    assert transport.records == []
+    await call_asgi(middleware, dummy_request(path="/fail"))
+    assert len(transport.records) == 2
+    with pytest.raises(RuntimeError):
+        await call_asgi(middleware, dummy_request(path="/raise"))
+    assert len(transport.records) == 4
+
+    sampler = middleware.tail_sampler
+    assert middleware.tracer._transport is sampler
+    assert sampler.traces_kept == 2
+    assert sampler.traces_dropped == 1
+    assert sampler.pending_traces == 0
+    stats = middleware.stats()
+    assert stats["traces_kept"] == 2
+    assert stats["tail_spans_dropped"] == 2
+    root = transport.records[1]
+    assert root["tags"]["http.status_code"] == "500"
+    assert {r["traceId"] for r in transport.records[:2]} == {root["traceId"]}
+
+
+@pytest.mark.asyncio
+async def test_middleware_root_span_error(
+    transport, failing_app, dummy_request, call_asgi
+):
+    config = ZipkinConfig(
+        transport=lambda address: transport,
+        tail_sampler=TailSampler,
+        tail_sampler_kwargs={"latency_threshold": 10},
+    )
+    middleware = ZipkinMiddleware(failing_app, config=config)
+    # below `error_status`, kept for the error tag of the root span
+    await call_asgi(middleware, dummy_request(path="/missing"))
+    assert len(transport.records) == 2
+    assert "error" in transport.records[1]["tags"]
+    assert middleware.tail_sampler.pending_traces == 0
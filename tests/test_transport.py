@@ -0,0 +1,295 @@
+import asyncio
+import json
+import queue
+import socket
+
+import aiozipkin as az
+import pytest
+
+from starlette_zipkin import (
+    BoundedTransport,
+    UdpTransport,
+    WorkerTransport,
+    ZipkinConfig,
+    ZipkinMiddleware,
+)
+from starlette_zipkin.record import LazyTag
+from starlette_zipkin.tracer import Tracer
+from starlette_zipkin.transports import DROP_NEWEST, DROP_OLDEST, PROCESS, THREAD
+
+
+def make_tracer(transport):
+    endpoint = az.create_endpoint("dummy-service")
+    return Tracer(transport, az.Sampler(sample_rate=1.0), endpoint)
+
+
+def finish_spans(tracer, count):
+    ids = []
+    for i in range(count):
+        with tracer.new_trace() as span:
+            span.name(f"span {i}")
+        ids.append(span.context.span_id)
+    return ids
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "drop_policy, kept",
+    [(DROP_OLDEST, slice(1, 3)), (DROP_NEWEST, slice(0, 2))],
+)
+async def test_drop_policy(collector, drop_policy, kept):
+    transport = BoundedTransport(
+        collector.address,
+        queue_size=2,
+        flush_interval=60,
+        drop_policy=drop_policy,
+    )
+    span_ids = finish_spans(make_tracer(transport), 3)
+    assert transport.queue_depth == 2
+    assert transport.spans_dropped == 1
+
+    await transport.close()
+    assert [span["id"] for span in collector.batches[0]] == span_ids[kept]
+    assert transport.spans_sent == 2
+
+
+@pytest.mark.asyncio
+async def test_batches(collector):
+    transport = BoundedTransport(collector.address, batch_size=2, flush_interval=60)
+    finish_spans(make_tracer(transport), 5)
+    await transport.close()
+    assert [len(batch) for batch in collector.batches] == [2, 2, 1]
+    assert transport.spans_sent == 5
+    assert transport.queue_depth == 0
+
+    stats = transport.stats()
+    assert stats["flushes"] == 3
+    assert stats["spans_sent"] == 5
+    assert 0 < stats["encode_seconds"] < stats["flush_seconds"]
+    assert 0 < stats["flush_max_seconds"] <= stats["flush_seconds"]
+
+
+@pytest.mark.asyncio
+async def test_flush_interval(collector):
+    transport = BoundedTransport(collector.address, flush_interval=0.01)
+    finish_spans(make_tracer(transport), 1)
+    for _ in range(100):
+        if transport.spans_sent:
+            break
+        await asyncio.sleep(0.01)
+    assert len(collector.batches) == 1
+    await transport.close()
+
+
+@pytest.mark.asyncio
+async def test_send_failure(collector):
+    collector.status = 500
+    transport = BoundedTransport(collector.address, flush_interval=60)
+    finish_spans(make_tracer(transport), 3)
+    await transport.close()
+    assert transport.spans_failed == 3
+    assert transport.spans_sent == 0
+
+
+@pytest.mark.asyncio
+async def test_send_retry(collector):
+    collector.statuses = [500, 503]
+    transport = BoundedTransport(
+        collector.address, batch_size=2, flush_interval=60, retry_backoff=0
+    )
+    finish_spans(make_tracer(transport), 2)
+    await transport._flush()
+    await asyncio.gather(*transport._senders)
+    assert transport.send_retries == 2
+    assert transport.spans_sent == 2
+    assert len(collector.requests) == 3
+    await transport.close()
+
+
+@pytest.mark.asyncio
+async def test_send_attempts(collector):
+    collector.status = 500
+    transport = BoundedTransport(
+        collector.address,
+        batch_size=2,
+        flush_interval=60,
+        send_attempts=2,
+        retry_backoff=0,
+    )
+    finish_spans(make_tracer(transport), 2)
+    await transport._flush()
+    await asyncio.gather(*transport._senders)
+    assert transport.stats()["send_retries"] == 1
+    assert transport.spans_failed == 2
+    await transport.close()
+
+
+@pytest.mark.asyncio
+async def test_encode_failure(collector):
+    transport = BoundedTransport(collector.address, flush_interval=60)
+
+    def encode(batch):
+        raise ValueError("not encodable")
+
+    transport._encode = encode
+    finish_spans(make_tracer(transport), 3)
+    await transport.close()
+    assert transport.spans_failed == 3
+    assert transport.spans_sent == 0
+    assert collector.requests == []
+
+
+@pytest.mark.asyncio
+async def test_unknown_drop_policy():
+    with pytest.raises(ValueError):
+        BoundedTransport("http://localhost:9411/api/v2/spans", drop_policy="nope")
+
+
+@pytest.mark.asyncio
+async def test_config_transport(next_app, dummy_request, call_asgi):
+    config = ZipkinConfig(transport_kwargs={"queue_size": 7})
+    middleware = ZipkinMiddleware(next_app, config=config)
+    await call_asgi(middleware, dummy_request())
+    transport = middleware.tracer._transport
+    assert isinstance(transport, BoundedTransport)
+    assert transport._queue_size == 7
+    assert transport.queue_depth == 1
+    await middleware.tracer.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("worker", [THREAD, PROCESS])
+async def test_worker_transport(collector, worker):
+    transport = WorkerTransport(
+        collector.address, worker=worker, batch_size=2, flush_interval=60
+    )
+    tracer = make_tracer(transport)
+    with tracer.new_trace() as span:
+        span.tag("lazy", LazyTag(str.upper, "value"))
+        span.annotate("annotation")
+    finish_spans(tracer, 2)
+    await transport.close()
+
+    assert [len(batch) for batch in collector.batches] == [2, 1]
+    assert transport.spans_sent == 3
+    assert collector.batches[0][0] == span._record.asdict()
+
+    stats = transport.stats()
+    assert stats["flushes"] == 2
+    assert stats["spans_sent"] == 3
+    assert stats["queue_depth"] == 0
+    assert 0 < stats["flush_max_seconds"] <= stats["flush_seconds"]
+
+
+@pytest.mark.asyncio
+async def test_worker_transport_failure(collector):
+    collector.status = 500
+    transport = WorkerTransport(collector.address, flush_interval=60)
+    finish_spans(make_tracer(transport), 2)
+    await transport.close()
+    assert transport.spans_failed == 2
+
+
+@pytest.mark.asyncio
+async def test_worker_transport_full_queue(collector):
+    transport = WorkerTransport(collector.address, flush_interval=60)
+    worker_queue = transport._queue
+    # a queue the worker does not consume from, already full
+    transport._queue = queue.Queue(maxsize=1)
+    finish_spans(make_tracer(transport), 2)
+    assert transport.spans_dropped == 1
+    transport._queue = worker_queue
+    await transport.close()
+
+
+@pytest.mark.asyncio
+async def test_unknown_worker():
+    with pytest.raises(ValueError):
+        WorkerTransport("http://localhost:9411/api/v2/spans", worker="nope")
+
+
+@pytest.fixture
+def udp_collector():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(1)
+    yield sock
+    sock.close()
+
+
+def receive_datagrams(sock, count):
+    return [sock.recv(65536) for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_udp_transport(udp_collector):
+    port = udp_collector.getsockname()[1]
+    transport = UdpTransport(
+        f"http://127.0.0.1:{port}/api/v2/spans", max_datagram_size=600
+    )
+    tracer = make_tracer(transport)
+    span_ids = finish_spans(tracer, 5)
+    await transport.close()
+
+    datagrams = receive_datagrams(udp_collector, transport.datagrams_sent)
+    assert 1 < len(datagrams) < 5
+    assert all(len(datagram) <= 600 for datagram in datagrams)
+    spans = [span for datagram in datagrams for span in json.loads(datagram)]
+    assert [span["id"] for span in spans] == span_ids
+    assert transport.spans_sent == 5
+    assert transport.stats()["datagrams_dropped"] == 0
+
+
+@pytest.mark.asyncio
+async def test_udp_transport_oversize(udp_collector):
+    port = udp_collector.getsockname()[1]
+    transport = UdpTransport(
+        "http://127.0.0.1/api/v2/spans", port=port, max_datagram_size=600
+    )
+    tracer = make_tracer(transport)
+    with tracer.new_trace() as span:
+        span.tag("big", "x" * 1000)
+    span_ids = finish_spans(tracer, 1)
+    await transport.close()
+
+    datagrams = receive_datagrams(udp_collector, 1)
+    assert [span["id"] for span in json.loads(datagrams[0])] == span_ids
+    assert transport.datagrams_oversize == 1
+    assert transport.spans_dropped == 1
+    assert transport.spans_sent == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not socket.has_ipv6, reason="no IPv6 support")
+async def test_udp_transport_ipv6():
+    try:
+        collector = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        collector.bind(("::1", 0))
+    except OSError:
+        pytest.skip("no IPv6 loopback")
+    collector.settimeout(1)
+    port = collector.getsockname()[1]
+    transport = UdpTransport(f"http://[::1]:{port}/api/v2/spans")
+    span_ids = finish_spans(make_tracer(transport), 1)
+    await transport.close()
+    with collector:
+        datagrams = receive_datagrams(collector, 1)
+    assert [span["id"] for span in json.loads(datagrams[0])] == span_ids
+
+
+@pytest.mark.asyncio
+async def test_udp_transport_no_listener():
+    # a closed port answers with ICMP port unreachable
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    transport = UdpTransport(f"http://127.0.0.1:{port}/api/v2/spans", batch_size=1)
+    tracer = make_tracer(transport)
+    for _ in range(3):
+        finish_spans(tracer, 1)
+        await asyncio.sleep(0.01)
+    await transport.close()
+    assert transport.datagrams_sent + transport.datagrams_dropped == 3
+    assert transport.datagrams_dropped >= 1
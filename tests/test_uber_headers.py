@@ -1,4 +1,6 @@
 import pytest
+from aiozipkin.helpers import TraceContext
+from starlette.responses import Response
 from starlette.testclient import TestClient
 
 from starlette_zipkin import UberHeaders as Headers
@@ -87,3 +89,103 @@ def test_split_char(app, tracer, uber_keys, split_char):
     assert all(key in response.headers for key in uber_keys)
     item = response.headers.get("uber-trace-id")
     assert split_char in item
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ([], None),
+        ([(b"uber-trace-id", b"t%3As")], None),
+        (
+            [(b"host", b"localhost"), (b"uber-trace-id", b"t%3As%3Ap%3A1")],
+            TraceContext("t", "p", "s", True, False, False),
+        ),
+        (
+            [(b"uber-trace-id", b"t%3As%3Ap%3A0")],
+            TraceContext("t", "p", "s", False, False, False),
+        ),
+        (
+            [(b"uber-trace-id", b"t%3As%3Ap%3A2")],
+            TraceContext("t", "p", "s", True, True, False),
+        ),
+    ],
+)
+def test_extract_context(raw, expected):
+    assert Headers().extract_context(raw) == expected
+
+
+def test_extract_context_split_char():
+    context = Headers(split_char=":").extract_context([(b"uber-trace-id", b"t:s:p:1")])
+    assert context == TraceContext("t", "p", "s", True, False, False)
+
+
+@pytest.fixture
+def count_parses(monkeypatch):
+    calls = []
+    parse_parts = Headers._parse_parts
+
+    def counting(parts):
+        calls.append(parts)
+        return parse_parts(parts)
+
+    monkeypatch.setattr(Headers, "_parse_parts", staticmethod(counting))
+    return calls
+
+
+def injecting_app(response_headers):
+    async def app(scope, receive, send) -> None:
+        await Response(headers=response_headers)(scope, receive, send)
+
+    return app
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "response_headers",
+    [
+        {},
+        {"uber-trace-id": "t%3As%3Ap%3A1"},
+        {"uber-trace-id": "t%3As%3Ap%3A1", "X-B3-TraceId": "t", "X-B3-SpanId": "s"},
+    ],
+)
+async def test_headers_parsed_once(
+    tracer, dummy_request, call_asgi, count_parses, response_headers
+):
+    config = ZipkinConfig(header_formatter=Headers)
+    middleware = ZipkinMiddleware(
+        injecting_app(response_headers), config=config, _tracer=tracer
+    )
+    request = dummy_request(headers={"uber-trace-id": "t%3As%3Ap%3A1"})
+    resp = await call_asgi(middleware, request)
+
+    # the request headers, and the response headers if the app set them
+    assert len(count_parses) == (2 if response_headers else 1)
+    assert resp.headers.getlist("uber-trace-id")[0].startswith("t%3A")
+    assert "x-b3-traceid" not in resp.headers
+
+
+@pytest.mark.asyncio
+async def test_response_headers_of_the_trace_are_kept(tracer, dummy_request, call_asgi):
+    config = ZipkinConfig(header_formatter=Headers)
+    app = injecting_app({"uber-trace-id": "t%3Aapp%3As%3A1"})
+    middleware = ZipkinMiddleware(app, config=config, _tracer=tracer)
+    request = dummy_request(headers={"uber-trace-id": "t%3As%3Ap%3A1"})
+    resp = await call_asgi(middleware, request)
+    assert resp.headers.getlist("uber-trace-id") == ["t%3Aapp%3As%3A1"]
+
+
+@pytest.mark.asyncio
+async def test_b3_response_headers_are_converted(tracer, dummy_request, call_asgi):
+    config = ZipkinConfig(header_formatter=Headers)
+    app = injecting_app(
+        {"X-B3-TraceId": "t", "X-B3-SpanId": "app", "X-B3-Sampled": "1"}
+    )
+    middleware = ZipkinMiddleware(app, config=config, _tracer=tracer)
+    resp = await call_asgi(middleware, dummy_request())
+    assert resp.headers.getlist("uber-trace-id") == ["t%3Aapp%3A0%3A1"]
+    assert "x-b3-traceid" not in resp.headers
+
+
+def test_get_trace_id():
+    assert Headers().get_trace_id({"uber-trace-id": "t%3As%3Ap%3A1"}) == "t"
+    assert Headers().get_trace_id({}) is None
@@ -0,0 +1,155 @@
+import pytest
+from aiozipkin.helpers import TraceContext
+from starlette.responses import Response
+from starlette.testclient import TestClient
+
+from starlette_zipkin import W3CHeaders as Headers
+from starlette_zipkin import ZipkinConfig, ZipkinMiddleware
+from starlette_zipkin.header_formatters.w3c import parse_traceparent
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+TRACEPARENT = f"00-{TRACE_ID}-{SPAN_ID}-01"
+
+
+def test_sync(app, tracer):
+    config = ZipkinConfig(header_formatter=Headers)
+    app.add_middleware(ZipkinMiddleware, config=config, _tracer=tracer)
+    client = TestClient(app)
+    response = client.get("/sync-message?foo=bar")
+    assert response.status_code == 200
+    assert parse_traceparent(response.headers["traceparent"].encode()) is not None
+    assert "tracestate" not in response.headers
+
+
+def test_request_data(app, tracer, transport):
+    config = ZipkinConfig(header_formatter=Headers)
+    app.add_middleware(ZipkinMiddleware, config=config, _tracer=tracer)
+    client = TestClient(app)
+    response = client.get("/async-message?foo=bar")
+    traceparent = response.headers["traceparent"]
+
+    # call with injected tracing headers - needs to follow up
+    response2 = client.get("/async-message", headers={"traceparent": traceparent})
+    assert response2.status_code == 200
+    context = parse_traceparent(traceparent.encode())
+    context2 = parse_traceparent(response2.headers["traceparent"].encode())
+    assert context.trace_id == context2.trace_id
+    assert context.span_id != context2.span_id
+    assert transport.records[1]["parentId"] == context.span_id
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (TRACEPARENT, TraceContext(TRACE_ID, None, SPAN_ID, True, False, False)),
+        (
+            f"00-{TRACE_ID}-{SPAN_ID}-00",
+            TraceContext(TRACE_ID, None, SPAN_ID, False, False, False),
+        ),
+        # only the sampled flag is known
+        (
+            f"00-{TRACE_ID}-{SPAN_ID}-09",
+            TraceContext(TRACE_ID, None, SPAN_ID, True, False, False),
+        ),
+        # future versions can append fields
+        (
+            f"cc-{TRACE_ID}-{SPAN_ID}-01-what-the-future-will-be-like",
+            TraceContext(TRACE_ID, None, SPAN_ID, True, False, False),
+        ),
+        (
+            f"01-{TRACE_ID}-{SPAN_ID}-01",
+            TraceContext(TRACE_ID, None, SPAN_ID, True, False, False),
+        ),
+        ("", None),
+        (TRACEPARENT[:-1], None),
+        (TRACEPARENT + "-", None),
+        (f"ff-{TRACE_ID}-{SPAN_ID}-01", None),
+        (f"cc-{TRACE_ID}-{SPAN_ID}-01.", None),
+        (f"00-{TRACE_ID.upper()}-{SPAN_ID}-01", None),
+        (f"00-{'0' * 32}-{SPAN_ID}-01", None),
+        (f"00-{TRACE_ID}-{'0' * 16}-01", None),
+        (f"00-{TRACE_ID}-{SPAN_ID}-0g", None),
+        (f"0x-{TRACE_ID}-{SPAN_ID}-01", None),
+        (f"00_{TRACE_ID}-{SPAN_ID}-01", None),
+        (f"00-{TRACE_ID[:-1]}z-{SPAN_ID}-01", None),
+        (f"00-{TRACE_ID}-{SPAN_ID[:-1]}--01", None),
+    ],
+)
+def test_parse_traceparent(value, expected):
+    assert parse_traceparent(value.encode()) == expected
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ([], None),
+        ([(b"tracestate", b"a=1")], None),
+        (
+            [(b"host", b"localhost"), (b"traceparent", TRACEPARENT.encode())],
+            TraceContext(TRACE_ID, None, SPAN_ID, True, False, False),
+        ),
+        ([(b"traceparent", b"invalid")], None),
+    ],
+)
+def test_extract_context(raw, expected):
+    assert Headers().extract_context(raw) == expected
+
+
+def test_make_headers():
+    context = TraceContext(TRACE_ID, "a" * 16, SPAN_ID, False, False, False)
+    assert Headers().make_headers(context, {}) == {
+        "traceparent": f"00-{TRACE_ID}-{SPAN_ID}-00"
+    }
+    context = context._replace(trace_id="a3ce929d0e0e4736", debug=True)
+    assert Headers().make_headers(context, {}) == {
+        "traceparent": f"00-0000000000000000a3ce929d0e0e4736-{SPAN_ID}-01"
+    }
+
+
+def test_make_context_round_trip():
+    context = TraceContext(TRACE_ID, None, SPAN_ID, True, False, False)
+    formatter = Headers()
+    assert formatter.make_context(formatter.make_headers(context, {})) == context
+    assert formatter.get_trace_id({"traceparent": TRACEPARENT}) == TRACE_ID
+    assert formatter.get_trace_id({}) is None
+
+
+@pytest.mark.asyncio
+async def test_tracestate_is_propagated(tracer, dummy_request, call_asgi):
+    config = ZipkinConfig(header_formatter=Headers)
+    middleware = ZipkinMiddleware(Response(), config=config, _tracer=tracer)
+    request = dummy_request(headers={"traceparent": TRACEPARENT})
+    # multiple headers are combined
+    request.scope["headers"] += [(b"tracestate", b"a=1"), (b"tracestate", b"b=2")]
+    response = await call_asgi(middleware, request)
+    assert response.headers["tracestate"] == "a=1,b=2"
+
+
+@pytest.mark.parametrize(
+    "received, expected",
+    [
+        (None, f"zipkin={SPAN_ID}"),
+        ("a=1,b=2", f"zipkin={SPAN_ID},a=1,b=2"),
+        ("a=1, zipkin=0123456789abcdef ,b=2", f"zipkin={SPAN_ID},a=1,b=2"),
+        (",".join(f"k{i}=v" for i in range(40)), None),
+    ],
+)
+def test_tracestate_key(received, expected):
+    formatter = Headers(tracestate_key="zipkin")
+    raw = [(b"traceparent", TRACEPARENT.encode())]
+    if received is not None:
+        raw.append((b"tracestate", received.encode()))
+    context = formatter.extract_context(raw)
+
+    tracestate = formatter.make_headers(context, {})["tracestate"]
+    if expected is None:
+        entries = tracestate.split(",")
+        assert len(entries) == 32
+        assert entries[:2] == [f"zipkin={SPAN_ID}", "k0=v"]
+    else:
+        assert tracestate == expected
+
+    # other traces do not inherit it
+    other = context._replace(trace_id="1" * 32)
+    assert formatter.make_headers(other, {})["tracestate"] == f"zipkin={SPAN_ID}"